@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import CustomUser , Child , Notifications , MostUseApps ,Notification
+from .models import CustomUser , Child , Notifications , MostUseApps ,Notification , AnalysisJob
 from django.contrib.auth.admin import UserAdmin
 
 admin.site.site_header = "ادارة نظام حماية الطفل"
@@ -49,4 +49,5 @@ admin.site.register(Child, ChildAdmin)
 admin.site.register(CustomUser, CustomUserAdmin)
 admin.site.register(Notifications)
 admin.site.register(MostUseApps)
-admin.site.register(Notification)
\ No newline at end of file
+admin.site.register(Notification)
+admin.site.register(AnalysisJob)
\ No newline at end of file
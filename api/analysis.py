@@ -0,0 +1,52 @@
+from django.conf import settings
+from .models import Notifications
+from .context import principal_for
+from .detect import content_model_weights, decode_image, detect_verdict
+from .dedup import dhash, verdict_cache
+from django.core.files.base import ContentFile
+
+
+def analyse_screenshot(user, data, filename):
+    """
+    Runs the content model on a screenshot and reports it to the father when something is found.
+    The screenshot is decoded from memory and only written to disk when a notification is created.
+    :param user: The child account that took the screenshot.
+    :param data: The encoded screenshot (bytes or memoryview).
+    :param filename: Original file name, used when the screenshot is stored on a notification.
+    :return: The detection result as a dict.
+    """
+    img0 = decode_image(data)
+    if img0 is None:
+        raise ValueError("تعذر قراءة الصورة")
+
+    # لقطات الشاشة المتطابقة تقريبا تعيد النتيجة السابقة بدون تشغيل النموذج
+    image_hash = None
+    if verdict_cache is not None:
+        image_hash = dhash(img0)
+        cached = verdict_cache.get(user.id, image_hash)
+        if cached is not None:
+            return {**cached, "cached": True}
+
+    verdict = detect_verdict(
+        weights=content_model_weights(),
+        source=img0,
+        conf_thres=0.35,
+        device=settings.CONTENT_MODEL_DEVICE,
+    )
+    notification = None
+    if verdict.unsafe:
+        notification = Notifications.objects.create(
+            ChildUser=principal_for(user).child,
+            imageOfNotification=ContentFile(bytes(data), name=filename),
+        )
+    result = {
+        "detected": verdict.unsafe,
+        "confidence": verdict.confidence,
+        "label": verdict.label,
+        "notification": notification.id if notification else None,
+        "image_path": notification.imageOfNotification.url if notification else None,
+        "cached": False,
+    }
+    if image_hash is not None:
+        verdict_cache.put(user.id, image_hash, result)
+    return result
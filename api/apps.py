@@ -5,3 +5,8 @@ class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
     verbose_name = "ادارة نظام حماية الطفل"
+
+    def ready(self):
+        # إشارات إبطال ذاكرة سياق المستخدم والتوكنات عند تعديل المستخدم أو الطفل،
+        # وإنشاء الصور المصغرة وإشعارات الأب وعداد غير المقروء للبلاغات الجديدة
+        from . import authentication, context, notifications, thumbnails  # noqa: F401
@@ -0,0 +1,202 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.crypto import salted_hmac
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from .context import partial_instance, principal_for
+from .models import Child, CustomUser
+
+# معلومات المستخدم المضمنة في التوكن
+CLAIMS = ("username", "userType", "child_id", "father_id")
+
+
+# بصمة كلمة المرور في التوكن، تغيير كلمة المرور يبطل التوكنات السابقة
+PASSWORD_CLAIM = "password_tag"
+
+
+def _state_key(user_id):
+    return f"jwt-user:{user_id}"
+
+
+def user_claims(user, child=None):
+    """
+    :param user: A loaded CustomUser.
+    :param child: The Child record of a child account, None for a father or an unlinked child.
+    :return: {claim: value} embedded in the tokens of the user.
+    """
+    return {
+        "username": user.username,
+        "userType": user.userType,
+        "child_id": child.id if child else None,
+        "father_id": child.FatherUser_id if child else None,
+    }
+
+
+def password_tag(user):
+    return salted_hmac("jwt-password", user.password).hexdigest()[:16]
+
+
+def _state(user, child=None):
+    if user is None or not user.is_active:
+        return {"active": False}
+    return {"active": True, PASSWORD_CLAIM: password_tag(user), **user_claims(user, child)}
+
+
+def publish_claims(user, child=None):
+    """
+    Records the current state of a user: whether it may authenticate, the fingerprint of
+    its password and its claims, which replace the claims of tokens issued before a change.
+    """
+    cache.set(_state_key(user.id), _state(user, child), settings.JWT_STATELESS_AUTH["STATE_TTL"])
+
+
+def revoke_tokens(user_id):
+    """
+    Rejects the tokens of a deleted user without waiting for the cached state to expire.
+    """
+    cache.set(_state_key(user_id), _state(None), settings.JWT_STATELESS_AUTH["STATE_TTL"])
+
+
+def tokens_for(user):
+    """
+    Issues a refresh token carrying the claims of the user; its access tokens inherit them.
+    :return: A RefreshToken.
+    """
+    child = principal_for(user).child
+    refresh = RefreshToken.for_user(user)
+    for claim, value in user_claims(user, child).items():
+        refresh[claim] = value
+    refresh[PASSWORD_CLAIM] = password_tag(user)
+    publish_claims(user, child)
+    return refresh
+
+
+def user_state(user_id):
+    """
+    The state of a user from the cache, or from the database on a miss: a missing entry
+    is never read as "not revoked". Each process sees a change made by another process
+    after at most STATE_TTL unless the cache is shared.
+    :return: {"active": bool, PASSWORD_CLAIM: str, claim: value}
+    """
+    key = _state_key(user_id)
+    state = cache.get(key)
+    if state is None:
+        user = CustomUser.objects.filter(id=user_id).first()
+        state = _state(user, principal_for(user).child if user else None)
+        cache.set(key, state, settings.JWT_STATELESS_AUTH["STATE_TTL"])
+    return state
+
+
+def current_claims(token):
+    """
+    Checks a token against the state of its user, one cache read on a hit.
+    :return: The current claims of the user, which replace the claims of the token.
+    :raises AuthenticationFailed: When the user was deleted or deactivated, or changed its
+        password after the token was issued.
+    """
+    state = user_state(token[api_settings.USER_ID_CLAIM])
+    if not state["active"]:
+        raise AuthenticationFailed("المستخدم غير موجود", code="user_not_found")
+    if token[PASSWORD_CLAIM] != state[PASSWORD_CLAIM]:
+        raise AuthenticationFailed(
+            "تم إبطال الجلسة، يرجى تسجيل الدخول مجددا", code="token_revoked"
+        )
+    return {claim: state[claim] for claim in CLAIMS}
+
+
+def load_user(user):
+    """
+    Loads a user built from token claims from the database, in one query. Every field is
+    reloaded, including the ones taken from the claims, so the user can be saved.
+    :return: The same user, fully loaded.
+    """
+    if user.get_deferred_fields():
+        user.refresh_from_db(
+            fields=[field.attname for field in user._meta.concrete_fields if not field.primary_key]
+        )
+    return user
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    Builds request.user from the claims of the access token instead of loading the user.
+    The user is a CustomUser with only id, username and userType loaded, its other fields
+    load on first access (see load_user()); user.claims carries the child and father ids
+    for get_principal(). The claims are checked against the state of the user (user_state()),
+    tokens issued before the claims were added fall back to a query.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            return super().get_user(validated_token)  # يرفض التوكن
+        if not settings.JWT_STATELESS_AUTH["ENABLED"] or PASSWORD_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+
+        claims = current_claims(validated_token)
+        user = partial_instance(
+            CustomUser,
+            id=validated_token[api_settings.USER_ID_CLAIM],
+            username=claims["username"],
+            userType=claims["userType"],
+            # الحالة المقروءة أعلاه ترفض المستخدم المعطل أو المحذوف
+            is_active=True,
+        )
+        user.claims = claims
+        return user
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refreshes the claims from the database when a new access token is issued, so changes
+    to the user or to its link with a father reach the token.
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+        user = CustomUser.objects.filter(
+            id=refresh[api_settings.USER_ID_CLAIM], is_active=True
+        ).first()
+        if user is None:
+            raise AuthenticationFailed("المستخدم غير موجود", code="user_not_found")
+        if refresh.get(PASSWORD_CLAIM, password_tag(user)) != password_tag(user):
+            raise AuthenticationFailed(
+                "تم إبطال الجلسة، يرجى تسجيل الدخول مجددا", code="token_revoked"
+            )
+        child = principal_for(user).child
+        for claim, value in user_claims(user, child).items():
+            refresh[claim] = value
+        publish_claims(user, child)
+        attrs["refresh"] = str(refresh)
+        return super().validate(attrs)
+
+
+@receiver(post_save, sender=CustomUser)
+def user_changed(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields == frozenset({"last_login"}):
+        return
+    # التعطيل وتغيير كلمة المرور يبطلان التوكنات السابقة
+    publish_claims(instance, principal_for(instance).child)
+
+
+@receiver(post_save, sender=Child)
+def child_changed(sender, instance, **kwargs):
+    # ربط الطفل بأب أو فكه يغير معرف الأب في التوكن
+    if instance.ChildUser_id:
+        publish_claims(instance.ChildUser, instance)
+
+
+@receiver(post_delete, sender=CustomUser)
+def user_deleted(sender, instance, **kwargs):
+    revoke_tokens(instance.id)
+
+
+@receiver(post_delete, sender=Child)
+def child_deleted(sender, instance, **kwargs):
+    # الحالة تقرأ من قاعدة البيانات في الطلب التالي
+    if instance.ChildUser_id:
+        cache.delete(_state_key(instance.ChildUser_id))
@@ -0,0 +1,132 @@
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+import torch
+from django.conf import settings
+from utils.general import LOGGER
+from utils.torch_utils import smart_inference_mode
+
+_schedulers = {}  # id(model) -> BatchScheduler
+_lock = threading.Lock()
+
+
+class BatchScheduler:
+    """
+    Collects concurrent inference requests for one model and runs them as a single batch.
+    A batch is dispatched when it holds max_batch_size images or when the oldest request
+    has waited max_wait_ms, whichever comes first.
+    """
+
+    def __init__(self, model, max_batch_size=8, max_wait_ms=10, log_every=0):
+        """
+        :param model: A DetectMultiBackend instance.
+        :param max_batch_size: Maximum number of images per forward pass.
+        :param max_wait_ms: Maximum time the first request of a batch waits for company.
+        :param log_every: Log batch-fill statistics every N batches (0 disables logging).
+        """
+        self.model = model
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0, max_wait_ms) / 1000
+        self.log_every = log_every
+        self.queue = queue.Queue()
+        self.sizes = Counter()  # batch size -> number of batches
+        self.stats_lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, name="content-model-batcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, im):
+        """
+        Queues one preprocessed image and blocks until its prediction is ready.
+        :param im: CHW tensor on the model device.
+        :return: Raw prediction for this image with a batch dimension of 1.
+        """
+        future = Future()
+        self.queue.put((im, future))
+        return future.result()
+
+    def stats(self):
+        """
+        :return: Batch-fill statistics since the scheduler started.
+        """
+        with self.stats_lock:
+            sizes = dict(self.sizes)
+        batches = sum(sizes.values())
+        images = sum(size * count for size, count in sizes.items())
+        return {
+            "batches": batches,
+            "images": images,
+            "mean_batch_size": images / batches if batches else 0.0,
+            "mean_fill": images / (batches * self.max_batch_size) if batches else 0.0,
+            "batch_sizes": dict(sorted(sizes.items())),
+        }
+
+    def _collect(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    @smart_inference_mode()
+    def _forward(self, items):
+        try:
+            pred = self.model(torch.stack([im for im, _ in items]))
+            if isinstance(pred, (list, tuple)):
+                pred = pred[0]
+        except Exception as e:
+            for _, future in items:
+                future.set_exception(e)
+            return
+        for i, (_, future) in enumerate(items):
+            future.set_result(pred[i : i + 1])
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # الصور ذات الأبعاد المختلفة لا يمكن دمجها في tensor واحد
+            groups = {}
+            for im, future in batch:
+                groups.setdefault(tuple(im.shape), []).append((im, future))
+            for items in groups.values():
+                self._forward(items)
+                with self.stats_lock:
+                    self.sizes[len(items)] += 1
+                    batches = sum(self.sizes.values())
+            if self.log_every and batches % self.log_every == 0:
+                LOGGER.info(f"Content model batching: {self.stats()}")
+
+
+def get_scheduler(model):
+    """
+    Returns the batch scheduler of a resident model, configured from settings.CONTENT_MODEL_BATCHING.
+    """
+    scheduler = _schedulers.get(id(model))
+    if scheduler is None:
+        with _lock:
+            scheduler = _schedulers.get(id(model))
+            if scheduler is None:
+                config = getattr(settings, "CONTENT_MODEL_BATCHING", {})
+                scheduler = BatchScheduler(
+                    model,
+                    max_batch_size=config.get("MAX_BATCH_SIZE", 8),
+                    max_wait_ms=config.get("MAX_WAIT_MS", 10),
+                    log_every=config.get("LOG_EVERY", 0),
+                )
+                _schedulers[id(model)] = scheduler
+    return scheduler
+
+
+def batching_enabled(model):
+    """
+    Batching is limited to PyTorch models; exported artifacts usually have a fixed batch size of 1.
+    """
+    return model.pt and getattr(settings, "CONTENT_MODEL_BATCHING", {}).get("ENABLED", False)
@@ -0,0 +1,115 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Child, CustomUser
+
+
+class Principal:
+    """
+    The authenticated user with their child record and the father the child is linked to.
+    Built once per request by get_principal(); child and father are None for a father account
+    and for a child that is not linked yet.
+    """
+
+    __slots__ = ("user", "child")
+
+    def __init__(self, user, child=None):
+        self.user = user
+        self.child = child
+
+    @property
+    def father(self):
+        # محمل مع الطفل من الذاكرة، أو عند أول استخدام لسياق مبني من التوكن
+        return self.child.FatherUser if self.child else None
+
+
+def partial_instance(model, **values):
+    """
+    Builds a model instance from known field values without a query, as if it was loaded
+    with only(); the other fields are deferred and load on first access.
+    :param values: {field attname: value}
+    """
+    names = [field.attname for field in model._meta.concrete_fields if field.attname in values]
+    return model.from_db(DEFAULT_DB_ALIAS, names, [values[name] for name in names])
+
+
+def _cache_key(user_id):
+    return f"principal:{user_id}"
+
+
+def principal_for(user):
+    """
+    Resolves the child record of a user through a short-TTL cache.
+    The cached Child carries its FatherUser, so the whole context costs at most one query.
+    :param user: A loaded CustomUser.
+    :return: A Principal.
+    """
+    if user.userType != "1":
+        return Principal(user)
+    key = _cache_key(user.id)
+    child = cache.get(key)
+    if child is None:
+        child = Child.objects.filter(ChildUser=user).select_related("FatherUser").first()
+        if child is None:
+            return Principal(user)
+        cache.set(key, child, getattr(settings, "PRINCIPAL_CACHE_TTL", 60))
+    child.ChildUser = user  # المستخدم محمل مسبقا من التوثيق
+    return Principal(user, child)
+
+
+def principal_from_claims(user, claims):
+    """
+    Builds the principal of a user authenticated from token claims, without a query.
+    :param claims: {"child_id", "father_id", ...} of the access token.
+    """
+    if not claims.get("child_id"):
+        return Principal(user)
+    child = partial_instance(
+        Child, id=claims["child_id"], ChildUser_id=user.id, FatherUser_id=claims["father_id"]
+    )
+    child.ChildUser = user
+    return Principal(user, child)
+
+
+def get_principal(request):
+    """
+    Returns the principal of a request, memoized on the request object.
+    :param request: A DRF or Django request with an authenticated user.
+    """
+    principal = getattr(request, "_principal", None)
+    if principal is None:
+        claims = getattr(request.user, "claims", None)
+        if claims is not None:
+            principal = principal_from_claims(request.user, claims)
+        else:
+            principal = principal_for(request.user)
+        request._principal = principal
+    return principal
+
+
+def invalidate_principal(user_id):
+    cache.delete(_cache_key(user_id))
+
+
+@receiver(post_save, sender=Child)
+@receiver(post_delete, sender=Child)
+def invalidate_child_principal(sender, instance, **kwargs):
+    if instance.ChildUser_id:
+        invalidate_principal(instance.ChildUser_id)
+
+
+@receiver(post_save, sender=CustomUser)
+def invalidate_father_principals(sender, instance, update_fields=None, **kwargs):
+    # الأبناء المرتبطون يحملون نسخة من بيانات الأب
+    if instance.userType != "0" or update_fields == frozenset({"last_login"}):
+        return
+    cache.delete_many(
+        [
+            _cache_key(user_id)
+            for user_id in Child.objects.filter(FatherUser=instance).values_list(
+                "ChildUser_id", flat=True
+            )
+        ]
+    )
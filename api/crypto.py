@@ -0,0 +1,83 @@
+import base64
+import hashlib
+import hmac
+import os
+from functools import cache
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from django.conf import settings
+
+
+class EncryptionHandler:
+    def __init__(self):
+        """
+        Initializes the encryption handler with a key derived from SECRET_KEY.
+        The AES key schedule is prepared once and shared by every encrypt/decrypt call;
+        use get_encryption() instead of creating a handler per call.
+        """
+        self.key = settings.SECRET_KEY.encode()[:32]
+        self.backend = default_backend()
+        self.algorithm = algorithms.AES(self.key)
+        # مفتاح منفصل لبصمة البحث عن مفتاح الطفل
+        self.lookup_key = hmac.new(
+            settings.SECRET_KEY.encode(), b"child-key-lookup", hashlib.sha256
+        ).digest()
+
+    def encrypt(self, data):
+        """
+        Encrypts the data using AES encryption and returns a Base64 encoded string.
+        :param data: The data to encrypt.
+        :return: The encrypted data as a Base64 string.
+        """
+        # Add padding to the data to ensure it's a multiple of the block size (AES block size is 128-bit = 16 bytes)
+        padder = padding.PKCS7(128).padder()
+        padded_data = padder.update(data.encode()) + padder.finalize()
+
+        # Generate a random IV (Initialization Vector)
+        iv = os.urandom(16)
+
+        encryptor = Cipher(self.algorithm, modes.CBC(iv), backend=self.backend).encryptor()
+        ciphertext = encryptor.update(padded_data) + encryptor.finalize()
+
+        # Combine IV and ciphertext, then convert to Base64
+        return base64.b64encode(iv + ciphertext).decode("utf-8")
+
+    def decrypt(self, base64_encrypted_data):
+        """
+        Decrypts the Base64 encoded encrypted data using AES decryption.
+        :param base64_encrypted_data: The encrypted data as a Base64 encoded string.
+        :return: The decrypted data (original message).
+        """
+        encrypted_data = base64.b64decode(base64_encrypted_data)
+
+        # Extract the IV and ciphertext from the encrypted data
+        iv = encrypted_data[:16]
+        ciphertext = encrypted_data[16:]
+
+        decryptor = Cipher(self.algorithm, modes.CBC(iv), backend=self.backend).decryptor()
+        padded_data = decryptor.update(ciphertext) + decryptor.finalize()
+
+        # Remove padding
+        unpadder = padding.PKCS7(128).unpadder()
+        data = unpadder.update(padded_data) + unpadder.finalize()
+
+        return data.decode()  # Decode back to string
+
+    def lookup_token(self, key):
+        """
+        Short keyed digest of a child key, stored next to it so a key given by a father is
+        found with an indexed equality lookup instead of matching or decrypting the key.
+        :param key: The Base64 key of a Child.
+        :return: 64 hex characters.
+        """
+        return hmac.new(self.lookup_key, key.encode(), hashlib.sha256).hexdigest()
+
+
+@cache
+def get_encryption():
+    """
+    :return: The EncryptionHandler shared by the process.
+    """
+    return EncryptionHandler()
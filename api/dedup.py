@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+from django.conf import settings
+
+
+def dhash(img, size=8):
+    """
+    Computes the difference hash of an image.
+    Near-identical screenshots (re-encoding, clock change, notification badge) differ by a few bits.
+    :param img: BGR or grayscale image as a numpy array.
+    :param size: Hash side; the hash has size * size bits.
+    :return: The hash as an int.
+    """
+    if img.ndim == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(img, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+class VerdictCache:
+    """
+    Per-child cache of detection results keyed by perceptual hash.
+    A lookup matches any cached hash of the same child within max_distance bits (Hamming distance).
+    Each child keeps at most max_entries hashes (least recently used are evicted), at most
+    max_children children are tracked, and entries expire after ttl seconds.
+    """
+
+    def __init__(self, max_distance=5, max_entries=64, max_children=1024, ttl=60):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.max_children = max_children
+        self.ttl = ttl
+        self.children = OrderedDict()  # child id -> OrderedDict(hash -> (result, expires))
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, child_id, image_hash):
+        """
+        :return: The cached result of a near-identical screenshot, or None.
+        """
+        now = time.monotonic()
+        with self.lock:
+            entries = self.children.get(child_id)
+            if entries is not None:
+                self.children.move_to_end(child_id)
+                for cached_hash, (result, expires) in list(entries.items()):
+                    if expires < now:
+                        del entries[cached_hash]
+                    elif (cached_hash ^ image_hash).bit_count() <= self.max_distance:
+                        entries.move_to_end(cached_hash)
+                        self.hits += 1
+                        return result
+            self.misses += 1
+            return None
+
+    def put(self, child_id, image_hash, result):
+        with self.lock:
+            entries = self.children.get(child_id)
+            if entries is None:
+                entries = self.children[child_id] = OrderedDict()
+                if len(self.children) > self.max_children:
+                    self.children.popitem(last=False)
+            self.children.move_to_end(child_id)
+            entries[image_hash] = (result, time.monotonic() + self.ttl)
+            entries.move_to_end(image_hash)
+            if len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "children": len(self.children),
+                "entries": sum(len(entries) for entries in self.children.values()),
+            }
+
+
+def _build_cache():
+    config = getattr(settings, "CONTENT_ANALYSIS_DEDUP", {})
+    if not config.get("ENABLED", False):
+        return None
+    return VerdictCache(
+        max_distance=config.get("MAX_DISTANCE", 5),
+        max_entries=config.get("MAX_ENTRIES", 64),
+        max_children=config.get("MAX_CHILDREN", 1024),
+        ttl=config.get("TTL", 60),
+    )
+
+
+verdict_cache = _build_cache()
@@ -1,32 +1,273 @@
 import torch
 import cv2
+import numpy as np
 from models.common import DetectMultiBackend
-from utils.general import non_max_suppression, scale_boxes
-from utils.torch_utils import select_device
+from .batching import batching_enabled, get_scheduler
+from .inference_pool import PoolUnavailable, get_pool, pool_enabled
+from utils.augmentations import letterbox
+from utils.general import LOGGER, check_img_size, non_max_suppression, scale_boxes
+from utils.torch_utils import select_device, smart_inference_mode
 from utils.plots import Annotator, colors
+from django.conf import settings
+from collections import namedtuple
+from functools import lru_cache
+from pathlib import Path
 import pathlib
+import platform
+import threading
 
-pathlib.PosixPath = pathlib.WindowsPath
+# النماذج المدربة على لينكس تحفظ مسارات PosixPath لا يمكن تحميلها على ويندوز
+if platform.system() == "Windows":
+    pathlib.PosixPath = pathlib.WindowsPath
 
-def detect_image(weights, image_path, conf_thres=0.25, iou_thres=0.45, device=''):
-    device = select_device(device)
-    model = DetectMultiBackend(weights, device=device)
+_models = {}  # (weights, device, fp16, backend) -> DetectMultiBackend
+_devices = {}  # device string -> torch.device
+_forward_locks = {}  # id(model) -> Lock
+_lock = threading.Lock()
+
+# artifacts produced by export.py next to the .pt weights
+BACKEND_SUFFIXES = {
+    "pt": ".pt",
+    "torchscript": ".torchscript",
+    "onnx": ".onnx",
+    "onnx-int8": "-int8.onnx",  # quantize.py
+    "openvino": "_openvino_model",
+}
+
+Verdict = namedtuple("Verdict", ("unsafe", "confidence", "label"))
+SAFE = Verdict(False, 0.0, "")
+
+
+def _select_device(device):
+    """
+    Resolves a device string once per process; select_device() logs on every call.
+    """
+    if device not in _devices:
+        _devices[device] = select_device(device)
+    return _devices[device]
+
+
+@lru_cache(maxsize=None)
+def content_model_weights():
+    """
+    Returns the content-model artifact for settings.CONTENT_MODEL_BACKEND.
+    The artifact is looked up next to settings.CONTENT_MODEL_WEIGHTS (best.onnx, best_openvino_model/, ...);
+    when it is missing the PyTorch weights are used instead.
+    """
+    weights = Path(settings.CONTENT_MODEL_WEIGHTS)
+    backend = getattr(settings, "CONTENT_MODEL_BACKEND", "pt")
+    if backend not in BACKEND_SUFFIXES:
+        raise ValueError(f"Unsupported CONTENT_MODEL_BACKEND {backend!r}, use one of {list(BACKEND_SUFFIXES)}")
+    artifact = weights.with_name(weights.stem + BACKEND_SUFFIXES[backend])
+    if not artifact.exists():
+        LOGGER.warning(f"Content model artifact {artifact} not found, falling back to PyTorch {weights}")
+        return str(weights)
+    return str(artifact)
+
+
+def _configure_threads(model, intra=0, inter=0):
+    """
+    Applies thread counts to PyTorch and to the ONNX Runtime / OpenVINO session of a model.
+    :param intra: Threads per operator, 0 keeps the runtime default.
+    :param inter: Operators run in parallel, 0 keeps the runtime default.
+    """
+    if intra:
+        torch.set_num_threads(intra)
+    if inter:
+        try:
+            torch.set_num_interop_threads(inter)
+        except RuntimeError:  # يمكن ضبطه مرة واحدة فقط قبل أول عملية متوازية
+            pass
+    if model.onnx and (intra or inter):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = intra
+        options.inter_op_num_threads = inter
+        model.session = onnxruntime.InferenceSession(
+            model.w, sess_options=options, providers=model.session.get_providers()
+        )
+    elif model.xml and intra:
+        model.ov_compiled_model = model.core.compile_model(
+            model.ov_model, device_name="CPU", config={"INFERENCE_NUM_THREADS": intra}
+        )
+
+
+def _model_key(weights, device, fp16=False, dnn=False):
+    """
+    Builds the registry key for a weights file.
+    :return: (resolved weights path, device, fp16, backend)
+    """
+    weights = Path(weights)
+    backend = "dnn" if dnn else weights.suffix.lstrip(".") or weights.name
+    return str(weights.resolve()), str(device), bool(fp16), backend
+
+
+def get_model(weights, device="", fp16=False, dnn=False):
+    """
+    Returns the resident model for the given weights, loading it on first use.
+    Each weights file is deserialized and fused once per process and shared by every request.
+    :param weights: Path to the weights file.
+    :param device: Device string accepted by select_device ("cpu", "0", ...).
+    :param fp16: Run the model in half precision.
+    :param dnn: Use OpenCV DNN for ONNX models.
+    :return: A DetectMultiBackend instance.
+    """
+    device = _select_device(device)
+    key = _model_key(weights, device, fp16, dnn)
+    model = _models.get(key)
+    if model is None:
+        with _lock:
+            model = _models.get(key)
+            if model is None:
+                model = DetectMultiBackend(weights, device=device, dnn=dnn, fp16=fp16)
+                model.eval()
+                threads = getattr(settings, "CONTENT_MODEL_THREADS", {})
+                _configure_threads(model, threads.get("INTRA_OP", 0), threads.get("INTER_OP", 0))
+                _forward_locks[id(model)] = threading.Lock()
+                _models[key] = model
+    return model
+
+
+def preprocess(img0, model, imgsz=None):
+    """
+    Letterboxes a BGR image for the model, keeping its aspect ratio.
+    PyTorch models get the minimum stride-multiple rectangle (a 1080x2400 screenshot becomes
+    288x640 at imgsz=640); fixed-shape exports are padded to the full imgsz square.
+    :param imgsz: Target size of the long side, settings.CONTENT_MODEL_IMGSZ by default.
+    :return: (1x3xHxW tensor on the model device, ratio, pad) for scale_boxes().
+    """
+    imgsz = check_img_size(imgsz or getattr(settings, "CONTENT_MODEL_IMGSZ", 640), s=model.stride)
+    img, ratio, pad = letterbox(img0, imgsz, stride=model.stride, auto=model.pt)
+    img = img.transpose((2, 0, 1))[::-1]  # HWC إلى CHW و BGR إلى RGB
+    img = np.ascontiguousarray(img)  # حل مشكلة stride السلبي
+    img = torch.from_numpy(img).to(model.device)
+    img = img.half() if model.fp16 else img.float()
+    img /= 255.0  # تطبيع القيم بين 0 و1
+    return img.unsqueeze(0), ratio, pad
+
+
+def infer(model, img):
+    """
+    Runs one preprocessed image through the model, through the batch scheduler when enabled.
+    Direct calls are serialised per model: Detect caches its grid per input shape, which is not
+    safe when concurrent requests have different shapes.
+    :return: Raw predictions.
+    """
+    if batching_enabled(model):
+        return get_scheduler(model).submit(img[0])
+    with _forward_locks[id(model)]:
+        return model(img, augment=False, visualize=False)
+
+
+@smart_inference_mode()
+def warm_up_models(imgsz=(1, 3, 640, 640)):
+    """
+    Loads the content-analysis model configured in settings and runs one forward pass,
+    so the first screenshot does not pay for loading and lazy initialisation.
+    """
+    weights = content_model_weights()
+    device = getattr(settings, "CONTENT_MODEL_DEVICE", "cpu")
+    if not Path(weights).exists():
+        LOGGER.warning(f"Content model {weights} not found, skipping warmup")
+        return None
+    if pool_enabled(device):  # النموذج يحمل في خادم الاستدلال فقط
+        try:
+            meta = get_pool().connect()
+        except PoolUnavailable:
+            meta = None  # تم التحذير، يحمل النموذج في هذه العملية بدلا منه
+        except RuntimeError as e:
+            LOGGER.warning(f"{e}, screenshots cannot be analysed until it is fixed")
+            return None
+        if meta is not None:
+            LOGGER.info(f"Content model server ready with {meta['weights']}")
+            return meta
+    model = get_model(weights, device=device)
+    im = torch.zeros(*imgsz, dtype=torch.half if model.fp16 else torch.float, device=model.device)
+    infer(model, im)
+    LOGGER.info(f"Content model {weights} loaded on {model.device}")
+    return model
+
+
+def decode_image(source):
+    """
+    Decodes an image without touching the filesystem when it is already in memory.
+    :param source: Encoded bytes, bytearray or memoryview, a numpy array (encoded buffer or
+        decoded HWC BGR image), or a file path.
+    :return: The decoded BGR image, or None if it cannot be decoded.
+    """
+    if isinstance(source, np.ndarray) and source.ndim == 3:
+        return source  # صورة مفككة مسبقا
+    if isinstance(source, (bytes, bytearray, memoryview, np.ndarray)):
+        buffer = np.frombuffer(source, dtype=np.uint8)  # بدون نسخ البيانات
+        return cv2.imdecode(buffer, cv2.IMREAD_COLOR) if buffer.size else None
+    return cv2.imread(str(source))
+
+
+def verdict_from_prediction(pred, names, conf_thres=0.25):
+    """
+    Reduces the raw Detect output of one image to a yes/no verdict and its top label.
+    Uses the same score as non_max_suppression (objectness * class probability); the best
+    candidate always survives NMS, so NMS and box drawing are not needed for the verdict.
+    :param pred: Tensor of shape (n, 5 + nc): xywh, objectness, class probabilities.
+    :return: A Verdict; SAFE when no candidate passes conf_thres.
+    """
+    candidates = pred[pred[:, 4] > conf_thres]
+    if not len(candidates):  # الحالة الأكثر شيوعا: لا يوجد محتوى غير لائق
+        return SAFE
+    conf, cls = (candidates[:, 5:] * candidates[:, 4:5]).max(1)
+    best = int(conf.argmax())
+    if conf[best] <= conf_thres:
+        return SAFE
+    return Verdict(True, round(float(conf[best]), 2), names[int(cls[best])])
+
+
+@smart_inference_mode()
+def detect_verdict(weights, source, conf_thres=0.25, device='', imgsz=None):
+    """
+    Verdict-only inference: answers "is there unsafe content?" without NMS or annotation.
+    With settings.CONTENT_INFERENCE_POOL enabled the image is handed to the inference server of
+    the node ("manage.py inference_server"), which decides the weights and inference size; while
+    the server cannot be reached the model of this process is used instead.
+    :param source: Anything accepted by decode_image().
+    :return: A Verdict.
+    """
+    img0 = decode_image(source)
+    assert img0 is not None, "Failed to decode image"
+    if pool_enabled(device):
+        try:
+            return Verdict(*get_pool().verdict(img0, conf_thres))
+        except PoolUnavailable:
+            pass  # تم التحذير عند أول فشل في الاتصال
+
+    model = get_model(weights, device=device)
+
+    img, _, _ = preprocess(img0, model, imgsz)
+    pred = infer(model, img)
+    if isinstance(pred, (list, tuple)):
+        pred = pred[0]
+    return verdict_from_prediction(pred[0], model.names, conf_thres)
+
+
+@smart_inference_mode()
+def detect_image(weights, source, conf_thres=0.25, iou_thres=0.45, device='', imgsz=None):
+    """
+    Runs the content model on one image.
+    :param source: Anything accepted by decode_image().
+    :param imgsz: Inference size, see preprocess().
+    :return: [isThere, confNumber, label]
+    """
+    model = get_model(weights, device=device)
     names = model.names
 
-    img0 = cv2.imread(image_path) 
-    assert img0 is not None, f"Failed to load image {image_path}"
+    img0 = decode_image(source)
+    assert img0 is not None, "Failed to decode image"
 
-    # تغيير حجم الصورة لتكون متوافقة مع YOLOv5
-    img = cv2.resize(img0, (640, 640), interpolation=cv2.INTER_LINEAR)
-    img = img[:, :, ::-1].transpose(2, 0, 1)  # BGR إلى RGB وتغيير الأبعاد
-    img = img.copy()  # حل مشكلة stride السلبي
-    img = torch.from_numpy(img).to(device)
-    img = img.float() / 255.0  # تطبيع القيم بين 0 و1
-    if img.ndimension() == 3:
-        img = img.unsqueeze(0)
+    # تغيير حجم الصورة مع الحفاظ على نسبة الأبعاد
+    img, ratio, pad = preprocess(img0, model, imgsz)
 
     # الكشف عن الكائنات
-    pred = model(img, augment=False, visualize=False)
+    pred = infer(model, img)
     pred = non_max_suppression(pred, conf_thres, iou_thres, max_det=1000)
     isThere = False
     confNumber = 0
@@ -36,7 +277,7 @@ def detect_image(weights, image_path, conf_thres=0.25, iou_thres=0.45, device=''
         annotator = Annotator(img0, line_width=3, example=str(names))
         if det is not None and len(det):
             # تحويل المربعات إلى حجم الصورة الأصلية
-            det[:, :4] = scale_boxes(img.shape[2:], det[:, :4], img0.shape).round()
+            det[:, :4] = scale_boxes(img.shape[2:], det[:, :4], img0.shape, (ratio, pad)).round()
 
             # رسم المربعات التوضيحية
             for *xyxy, conf, cls in det:
@@ -44,7 +285,7 @@ def detect_image(weights, image_path, conf_thres=0.25, iou_thres=0.45, device=''
                 confNumber = f'{conf:.2f}%'
                 label = f"{names[int(cls)]} {conf:.2f}"
                 annotator.box_label(xyxy, label, color=colors(int(cls), True))
-        
+
         img_result = annotator.result()
 
         return [isThere , confNumber , label]
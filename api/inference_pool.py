@@ -0,0 +1,405 @@
+import itertools
+import math
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+from django.conf import settings
+from django.utils.crypto import salted_hmac
+from utils.augmentations import letterbox
+from utils.general import LOGGER, check_img_size
+
+_clients = {}  # address -> PoolClient
+_lock = threading.Lock()
+
+
+class PoolUnavailable(RuntimeError):
+    """
+    The inference server of the node cannot be reached; callers fall back to their own model.
+    """
+
+
+def _slot(shm, index, slot_bytes, shape=None):
+    """
+    Returns a uint8 view of one slot of the shared-memory ring, without copying.
+    """
+    count = int(np.prod(shape)) if shape else slot_bytes
+    return np.ndarray((count,), dtype=np.uint8, buffer=shm.buf, offset=index * slot_bytes).reshape(shape or -1)
+
+
+def _collect(tasks, max_batch_size, max_wait):
+    """
+    Takes the next task and the ones queued behind it, up to max_batch_size, waiting at most
+    max_wait seconds for company like BatchScheduler.
+    :return: (tasks, stop) where stop tells the process to exit after this batch.
+    """
+    task = tasks.get()
+    if task is None:
+        return [], True
+    batch = [task]
+    deadline = time.monotonic() + max_wait
+    while len(batch) < max_batch_size:
+        try:
+            task = tasks.get(timeout=max(0, deadline - time.monotonic()))
+        except queue.Empty:
+            break
+        if task is None:
+            return batch, True
+        batch.append(task)
+    return batch, False
+
+
+def _serve(index, weights, device, cores, shm_name, slot_bytes, tasks, results):
+    """
+    Entry point of an inference process: pins itself to its cores, loads the model once and
+    answers verdict requests read from the shared-memory slots until it receives None.
+    Requests queued together run as one batch (settings.CONTENT_MODEL_BATCHING).
+    """
+    import torch
+    from models.common import DetectMultiBackend
+    from utils.torch_utils import select_device
+    from .batching import batching_enabled
+    from .detect import _configure_threads, verdict_from_prediction
+
+    # الإيقاف يتم عبر الطابور بعد إنهاء الدفعة الحالية
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(len(cores))
+    torch.set_num_interop_threads(1)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        model = DetectMultiBackend(weights, device=select_device(device))
+        model.eval()
+        _configure_threads(model, len(cores), 1)
+        results.put((None, index, {"stride": model.stride, "pt": model.pt, "fp16": model.fp16}, None))
+    except Exception as e:
+        results.put((None, index, None, f"{type(e).__name__}: {e}"))
+        shm.close()
+        return
+
+    config = getattr(settings, "CONTENT_MODEL_BATCHING", {})
+    max_batch_size = config.get("MAX_BATCH_SIZE", 8) if batching_enabled(model) else 1
+    max_wait = config.get("MAX_WAIT_MS", 10) / 1000
+    stop = False
+    with torch.inference_mode():
+        while not stop:
+            batch, stop = _collect(tasks, max_batch_size, max_wait)
+            # الصور ذات الأبعاد المختلفة لا يمكن دمجها في tensor واحد
+            groups = {}
+            for task in batch:
+                groups.setdefault(task[2], []).append(task)
+            for shape, group in groups.items():
+                try:
+                    im = torch.from_numpy(
+                        np.stack([_slot(shm, slot, slot_bytes, shape) for _, slot, _, _ in group])
+                    ).to(model.device)
+                    im = im.half() if model.fp16 else im.float()  # نسخة جديدة، يمكن إعادة استخدام الخانات
+                    pred = model(im / 255.0)
+                    if isinstance(pred, (list, tuple)):
+                        pred = pred[0]
+                    for i, (task_id, slot, _, conf_thres) in enumerate(group):
+                        verdict = tuple(verdict_from_prediction(pred[i], model.names, conf_thres))
+                        results.put((task_id, slot, verdict, None))
+                except Exception as e:
+                    for task_id, slot, _, _ in group:
+                        results.put((task_id, slot, None, f"{type(e).__name__}: {e}"))
+    shm.close()
+
+
+class InferencePool:
+    """
+    The fixed set of inference processes of a node, owned by "manage.py inference_server".
+    Each process is pinned to its own subset of the allowed cores and runs PyTorch with one
+    thread per core, so concurrent uploads never oversubscribe the CPU.
+    Letterboxed images are written into a ring of shared-memory slots and only the slot index
+    travels through the task queue; verdicts come back as small tuples on a result queue.
+    Web and analysis workers reach the pool through serve() and PoolClient.
+    """
+
+    def __init__(self, weights, device="cpu", workers=2, slots=8, imgsz=640, timeout=30):
+        """
+        :param weights: Path to the weights file, loaded once by every inference process.
+        :param workers: Number of inference processes; the allowed cores are split evenly between them.
+        :param slots: Number of shared-memory image slots; requests wait when all of them are in flight.
+        :param imgsz: Inference size (long side), see detect.preprocess().
+        :param timeout: Seconds a request waits for a slot or for its verdict.
+        """
+        cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count()))
+        groups = [[int(c) for c in group] for group in np.array_split(cores, min(workers, len(cores)))]
+        self.weights = weights
+        self.imgsz = imgsz
+        side = math.ceil(imgsz / 64) * 64  # أكبر stride مستخدم في YOLOv5
+        self.slot_bytes = 3 * side * side
+        self.timeout = timeout
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * self.slot_bytes)
+        self.free = queue.Queue()
+        for i in range(slots):
+            self.free.put(i)
+        self.pending = {}  # task id -> Future
+        self.ids = itertools.count()
+        self.meta = None
+        self.error = None
+        self.ready = threading.Event()
+
+        ctx = multiprocessing.get_context("spawn")
+        self.tasks, self.results = ctx.Queue(), ctx.Queue()
+        self.processes = [
+            ctx.Process(
+                target=_serve,
+                args=(i, weights, device, group, self.shm.name, self.slot_bytes, self.tasks, self.results),
+                name=f"content-model-{i}",
+                daemon=True,
+            )
+            for i, group in enumerate(groups)
+        ]
+        for p in self.processes:
+            p.start()
+        self.dispatcher = threading.Thread(target=self._dispatch, name="content-model-pool", daemon=True)
+        self.dispatcher.start()
+        LOGGER.info(f"Content model pool: {len(groups)} processes on cores {groups}, {slots} slots")
+
+    def _dispatch(self):
+        try:
+            for task_id, slot, value, error in iter(self.results.get, None):
+                if task_id is None:  # رسالة جاهزية من إحدى العمليات
+                    if value is None:
+                        self.error = error
+                    elif self.meta is None:
+                        self.imgsz = check_img_size(self.imgsz, s=value["stride"])
+                        self.meta = value
+                    self.ready.set()
+                    continue
+                self.free.put(slot)
+                future = self.pending.pop(task_id, None)
+                if future is None:  # انتهت مهلة الطلب
+                    continue
+                if error:
+                    future.set_exception(RuntimeError(error))
+                else:
+                    future.set_result(value)
+        except (EOFError, OSError, TypeError, ValueError):
+            # الطابور أغلق عند خروج المفسر
+            pass
+
+    def describe(self):
+        """
+        :return: What a PoolClient needs to letterbox images into the slots.
+        :raises RuntimeError: When the inference processes could not load the model.
+        """
+        if not self.ready.wait(self.timeout) or self.meta is None:
+            raise RuntimeError(f"Content model pool failed to start: {self.error or 'timeout'}")
+        return {
+            "shm": self.shm.name,
+            "slot_bytes": self.slot_bytes,
+            "imgsz": self.imgsz,
+            "stride": self.meta["stride"],
+            "pt": self.meta["pt"],
+            "weights": self.weights,
+        }
+
+    def acquire(self):
+        """
+        :return: The index of a free slot.
+        :raises queue.Empty: When every slot stayed in flight for the timeout.
+        """
+        return self.free.get(timeout=self.timeout)
+
+    def submit(self, slot, shape, conf_thres=0.25):
+        """
+        Queues the image written into an acquired slot; the slot is released with the verdict.
+        :return: A Future of (unsafe, confidence, label).
+        """
+        task_id = next(self.ids)
+        future = self.pending[task_id] = Future()
+        self.tasks.put((task_id, slot, shape, conf_thres))
+        return future
+
+    def close(self):
+        for _ in self.processes:
+            self.tasks.put(None)
+        for p in self.processes:
+            p.join(timeout=5)
+        self.results.put(None)
+        self.dispatcher.join(timeout=5)
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _authkey():
+    return salted_hmac("content-model-server", "").digest()
+
+
+def _handle(pool, conn):
+    held = set()  # خانات حجزها العميل ولم يرسلها بعد
+    try:
+        conn.send(("ok", pool.describe()))
+        while True:
+            message = conn.recv()
+            if message[0] == "acquire":
+                try:
+                    slot = pool.acquire()
+                except queue.Empty:
+                    conn.send(("error", "Content model pool is busy"))
+                    continue
+                held.add(slot)
+                conn.send(("ok", slot))
+            elif message[0] == "run":
+                _, slot, shape, conf_thres = message
+                held.discard(slot)
+                future = pool.submit(slot, shape, conf_thres)
+                try:
+                    conn.send(("ok", future.result(timeout=pool.timeout)))
+                except Exception as e:
+                    conn.send(("error", f"{type(e).__name__}: {e}"))
+    except (EOFError, OSError):
+        pass  # العميل أغلق الاتصال
+    except RuntimeError as e:
+        conn.send(("error", str(e)))
+    finally:
+        for slot in held:
+            pool.free.put(slot)
+        conn.close()
+
+
+def serve(pool, address):
+    """
+    Accepts the connections of web and analysis workers until interrupted, one thread each.
+    :param address: A Unix socket path, or (host, port) where Unix sockets are not available.
+    """
+    if isinstance(address, str) and os.path.exists(address):
+        os.unlink(address)  # مقبس متبقي من تشغيل سابق
+    with Listener(address, authkey=_authkey()) as listener:
+        LOGGER.info(f"Content model server listening on {address}")
+        while True:
+            try:
+                conn = listener.accept()
+            except (multiprocessing.AuthenticationError, OSError) as e:
+                LOGGER.warning(f"Content model server refused a connection: {e}")
+                continue
+            threading.Thread(target=_handle, args=(pool, conn), name="content-model-client", daemon=True).start()
+
+
+class PoolClient:
+    """
+    The side of the node inference pool living in web and analysis workers.
+    Images are letterboxed straight into a slot of the shared-memory ring of the server and
+    only the slot index goes through the socket. Each request thread borrows one connection.
+    """
+
+    def __init__(self, address, timeout=30):
+        self.address = address
+        self.timeout = timeout
+        self.connections = queue.LifoQueue()  # اتصالات غير مستخدمة
+        self.meta = None
+        self.shm = None
+        self.lock = threading.Lock()
+        self.reachable = True  # للتحذير مرة واحدة عند كل انقطاع
+
+    def _connect(self):
+        try:
+            conn = Client(self.address, authkey=_authkey())
+        except OSError as e:
+            error = PoolUnavailable(
+                f"Content model server not reachable at {self.address} ({e}), "
+                "start it with 'manage.py inference_server'"
+            )
+            if self.reachable:
+                LOGGER.warning(f"{error}; the model is loaded in this process until then")
+            self.reachable = False
+            raise error from e
+        if not self.reachable:
+            LOGGER.info(f"Content model server reachable again at {self.address}")
+            self.reachable = True
+        meta = self._reply(conn)
+        with self.lock:
+            if self.meta is None or self.meta["shm"] != meta["shm"]:  # الخادم أعيد تشغيله
+                shm = shared_memory.SharedMemory(name=meta["shm"])
+                if os.name == "posix":
+                    # الذاكرة ملك الخادم، متتبع الموارد كان سيحذفها عند خروج هذه العملية
+                    from multiprocessing import resource_tracker
+
+                    resource_tracker.unregister(shm._name, "shared_memory")
+                self.shm, self.meta = shm, meta
+        return conn
+
+    def _reply(self, conn):
+        if not conn.poll(self.timeout):
+            raise RuntimeError("Content model server did not answer in time")
+        status, value = conn.recv()
+        if status != "ok":
+            raise RuntimeError(value)
+        return value
+
+    def connect(self):
+        """
+        Opens one connection ahead of the first request.
+        :return: The description of the pool, see InferencePool.describe().
+        """
+        self.connections.put(self._connect())
+        return self.meta
+
+    def verdict(self, img0, conf_thres=0.25):
+        """
+        Letterboxes a decoded BGR image into a slot of the server and waits for its verdict.
+        :return: (unsafe, confidence, label)
+        :raises PoolUnavailable: When the server cannot be reached.
+        """
+        try:
+            conn = self.connections.get_nowait()
+        except queue.Empty:
+            return self._verdict(self._connect(), img0, conf_thres)
+        try:
+            return self._verdict(conn, img0, conf_thres)
+        except (EOFError, OSError):
+            # الخادم أعيد تشغيله منذ آخر استخدام لهذا الاتصال
+            return self._verdict(self._connect(), img0, conf_thres)
+
+    def _verdict(self, conn, img0, conf_thres):
+        try:
+            meta, shm = self.meta, self.shm
+            img = letterbox(img0, meta["imgsz"], stride=meta["stride"], auto=meta["pt"])[0]
+            shape = (3, *img.shape[:2])
+            conn.send(("acquire",))
+            slot = self._reply(conn)
+            _slot(shm, slot, meta["slot_bytes"], shape)[:] = img.transpose((2, 0, 1))[::-1]  # HWC إلى CHW و BGR إلى RGB
+            conn.send(("run", slot, shape, conf_thres))
+            verdict = self._reply(conn)
+        except BaseException:
+            # حالة الاتصال غير معروفة، الخادم يحرر الخانة عند إغلاقه
+            conn.close()
+            raise
+        self.connections.put(conn)
+        return verdict
+
+
+def pool_enabled(device=""):
+    """
+    The pool runs CPU inference only; GPU models stay in the request process.
+    """
+    config = getattr(settings, "CONTENT_INFERENCE_POOL", {})
+    return config.get("ENABLED", False) and str(device).lower() in ("", "cpu")
+
+
+def get_pool():
+    """
+    Returns the client of the inference server of this node, configured from
+    settings.CONTENT_INFERENCE_POOL. The server decides the weights and inference size.
+    """
+    config = getattr(settings, "CONTENT_INFERENCE_POOL", {})
+    address = config.get("ADDRESS")
+    key = tuple(address) if isinstance(address, list) else address
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = PoolClient(address, timeout=config.get("TIMEOUT", 30))
+    return client
@@ -0,0 +1,120 @@
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+from utils.general import LOGGER
+from .models import AnalysisJob
+from .analysis import analyse_screenshot
+import time
+
+
+def enqueue_job(user, image_file):
+    """
+    Stores the uploaded screenshot in the queue table and queues it for analysis.
+    :return: The created AnalysisJob.
+    """
+    image_file.seek(0)
+    return AnalysisJob.objects.create(
+        user=user, payload=image_file.read(), filename=image_file.name
+    )
+
+
+def claim_next_job():
+    """
+    Atomically moves the oldest pending job to running.
+    Several worker processes can call this concurrently; only one of them wins each job.
+    :return: The claimed job, or None when the queue is empty.
+    """
+    while True:
+        job_id = (
+            AnalysisJob.objects.filter(status=AnalysisJob.PENDING)
+            .order_by("created_at")
+            .values_list("id", flat=True)
+            .first()
+        )
+        if job_id is None:
+            return None
+        claimed = AnalysisJob.objects.filter(
+            id=job_id, status=AnalysisJob.PENDING
+        ).update(
+            status=AnalysisJob.RUNNING,
+            started_at=timezone.now(),
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return AnalysisJob.objects.select_related("user").get(id=job_id)
+
+
+def requeue_stale_jobs(timeout):
+    """
+    Puts back jobs left running by a worker that died before finishing them.
+    Jobs that already used their MAX_ATTEMPTS are marked failed instead.
+    :param timeout: A timedelta after which a running job is considered abandoned.
+    :return: The number of requeued jobs.
+    """
+    now = timezone.now()
+    stale = AnalysisJob.objects.filter(
+        status=AnalysisJob.RUNNING, started_at__lt=now - timeout
+    )
+    max_attempts = settings.CONTENT_ANALYSIS_JOBS["MAX_ATTEMPTS"]
+    # صورة توقف العامل في كل محاولة (نفاد الذاكرة، تعطل فك الصورة) لا تعاد بلا نهاية
+    stale.filter(attempts__gte=max_attempts).update(
+        status=AnalysisJob.FAILED,
+        error="توقف التحليل قبل اكتماله",
+        finished_at=now,
+        payload=b"",
+    )
+    return stale.filter(attempts__lt=max_attempts).update(status=AnalysisJob.PENDING)
+
+
+def process_job(job):
+    """
+    Analyses the screenshot of a claimed job and records the outcome on the job row.
+    """
+    config = settings.CONTENT_ANALYSIS_JOBS
+    try:
+        job.result = analyse_screenshot(job.user, job.payload, job.filename)
+        job.status = AnalysisJob.DONE
+        job.error = ""
+    except Exception as e:
+        LOGGER.exception(f"Analysis job {job.id} failed")
+        job.error = str(e)
+        job.status = (
+            AnalysisJob.FAILED
+            if job.attempts >= config["MAX_ATTEMPTS"]
+            else AnalysisJob.PENDING
+        )
+    job.finished_at = timezone.now()
+    if job.status != AnalysisJob.PENDING:
+        job.payload = b""  # الصورة محفوظة في البلاغ إذا لزم الأمر
+    job.save()
+    return job
+
+
+def purge_finished_jobs(retention):
+    """
+    Deletes finished job rows older than the retention period.
+    """
+    return AnalysisJob.objects.filter(
+        status__in=(AnalysisJob.DONE, AnalysisJob.FAILED),
+        finished_at__lt=timezone.now() - retention,
+    ).delete()
+
+
+def run_worker(stop_event=None):
+    """
+    Consumes the analysis queue until stop_event is set.
+    """
+    config = settings.CONTENT_ANALYSIS_JOBS
+    last_maintenance = 0
+    while not (stop_event and stop_event.is_set()):
+        close_old_connections()
+        if time.monotonic() - last_maintenance > config["STALE_AFTER"].total_seconds():
+            requeue_stale_jobs(config["STALE_AFTER"])
+            purge_finished_jobs(config["RETENTION"])
+            last_maintenance = time.monotonic()
+        job = claim_next_job()
+        if job is None:
+            time.sleep(config["POLL_INTERVAL"])
+            continue
+        process_job(job)
@@ -0,0 +1,71 @@
+import multiprocessing
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+def _worker(stop_event):
+    import django
+
+    django.setup()
+    # إنهاء المهمة الحالية قبل الخروج
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+
+    from api.detect import warm_up_models
+    from api.jobs import run_worker
+
+    warm_up_models()
+    run_worker(stop_event)
+
+
+class Command(BaseCommand):
+    help = "Runs a pool of workers that consume the screenshot analysis queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=2,
+            help="Number of workers (threads sharing the inference server of the node "
+            "when CONTENT_INFERENCE_POOL is enabled, processes otherwise)",
+        )
+
+    def handle(self, *args, **options):
+        from api.detect import warm_up_models
+        from api.inference_pool import pool_enabled
+        from api.jobs import run_worker
+
+        if pool_enabled(settings.CONTENT_MODEL_DEVICE):
+            # الاستدلال يتم في خادم الاستدلال، يكفي خيط لكل عامل في هذه العملية
+            warm_up_models()
+            stop_event = threading.Event()
+            processes = [
+                threading.Thread(
+                    target=run_worker, args=(stop_event,), name=f"analysis-worker-{i}"
+                )
+                for i in range(options["workers"])
+            ]
+        else:
+            ctx = multiprocessing.get_context("spawn")
+            stop_event = ctx.Event()
+            processes = [
+                ctx.Process(
+                    target=_worker, args=(stop_event,), name=f"analysis-worker-{i}"
+                )
+                for i in range(options["workers"])
+            ]
+        for p in processes:
+            p.start()
+        self.stdout.write(f"Started {len(processes)} analysis workers")
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+        try:
+            for p in processes:
+                p.join()
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping analysis workers...")
+            stop_event.set()
+            for p in processes:
+                p.join()
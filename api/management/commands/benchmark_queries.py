@@ -0,0 +1,236 @@
+import importlib
+import random
+import secrets
+import statistics
+import time
+from datetime import date, timedelta
+from datetime import time as clock
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+
+# migrations whose indexes are compared
+INDEX_MIGRATIONS = (
+    "api.migrations.0015_notification_counter",
+    "api.migrations.0016_hot_path_indexes",
+    "api.migrations.0017_child_key_lookup",
+)
+BATCH_SIZE = 10000
+
+
+def _hot_queries(sample):
+    """
+    The lookups behind the API endpoints, as querysets built from random seeded values.
+    :return: [(name, function(rng) -> queryset), ...]
+    """
+    from api.crypto import get_encryption
+    from api.models import Child, CustomUser, MostUseApps, Notification, Notifications
+    from api.pagination import encode_cursor, keyset_filter
+
+    def feed(rng, cursor=None):
+        return keyset_filter(
+            Notifications.objects.filter(ChildUser__FatherUser=rng.choice(sample["fathers"])),
+            cursor=cursor,
+        ).select_related("ChildUser__ChildUser")[:21]
+
+    def next_page(rng):
+        day = sample["start"] + timedelta(days=rng.randrange(sample["days"]))
+        cursor = encode_cursor(Notifications(dateOfNotification=day, id=sample["max_id"]))
+        return feed(rng, cursor)
+
+    def child_apps(rng):
+        father, child = rng.choice(sample["links"])
+        return MostUseApps.objects.filter(
+            ChildUser__FatherUser=father, ChildUser__ChildUser=child
+        ).order_by("-hour")
+
+    return [
+        ("login", lambda rng: CustomUser.objects.filter(
+            username=f"father{rng.randrange(len(sample['fathers']))}", userType="0"
+        )),
+        ("link child (key)", lambda rng: Child.objects.filter(
+            lookup=get_encryption().lookup_token(rng.choice(sample["keys"]))
+        )),
+        ("notification feed", feed),
+        ("notification feed, next page", next_page),
+        ("children most used apps", lambda rng: MostUseApps.objects.filter(
+            ChildUser__FatherUser=rng.choice(sample["fathers"])
+        ).order_by("-hour")[:5]),
+        ("child most used apps", child_apps),
+        ("unread notifications", lambda rng: Notification.objects.filter(
+            user=rng.choice(sample["fathers"]), is_read=False
+        ).order_by("-created_at")),
+    ]
+
+
+def _index_operations():
+    """
+    :return: [(model, index), ...] added by the index migrations and not removed since.
+    """
+    from django.apps import apps
+    from django.db.migrations import AddIndex, RemoveIndex
+
+    indexes = {}
+    for name in INDEX_MIGRATIONS:
+        for operation in importlib.import_module(name).Migration.operations:
+            if isinstance(operation, AddIndex):
+                indexes[operation.model_name, operation.index.name] = operation.index
+            elif isinstance(operation, RemoveIndex):
+                indexes.pop((operation.model_name, operation.name), None)
+    return [
+        (apps.get_model("api", model_name), index)
+        for (model_name, _), index in indexes.items()
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a throwaway test database and reports query plans and latencies of the "
+        "hot API lookups with and without the indexes of the hot-path index migrations."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows", type=int, default=1000000, help="Number of alerts (Notifications) to seed"
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=200, help="Executions of each query per measurement"
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Random seed")
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict["NAME"]
+        # قاعدة بيانات مؤقتة، لا تلمس بيانات المستخدمين
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            rng = random.Random(options["seed"])
+            t = time.perf_counter()
+            sample = self.seed(rng, options["rows"])
+            self.stdout.write(
+                f"Seeded {options['rows']} alerts in {time.perf_counter() - t:.1f}s "
+                f"({connection.vendor})"
+            )
+            queries = _hot_queries(sample)
+            after = self.measure(queries, options)
+            with connection.schema_editor() as editor:
+                for model, index in _index_operations():
+                    editor.remove_index(model, index)
+            self.analyze()
+            before = self.measure(queries, options)
+            self.report(queries, before, after)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def seed(self, rng, rows):
+        from api.crypto import get_encryption
+        from api.models import Child, CustomUser, MostUseApps, Notification, Notifications
+
+        fathers = max(1, rows // 100)
+        children = fathers * 2
+        start, days = date(2025, 1, 1), 365
+
+        CustomUser.objects.bulk_create(
+            (
+                CustomUser(
+                    username=f"{kind}{i}",
+                    first_name=kind,
+                    last_name=str(i),
+                    userType=user_type,
+                    password="!",
+                )
+                for kind, user_type, count in (("father", "0", fathers), ("child", "1", children))
+                for i in range(count)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        father_ids = list(CustomUser.objects.filter(userType="0").values_list("id", flat=True))
+        child_user_ids = list(CustomUser.objects.filter(userType="1").values_list("id", flat=True))
+        keys = [secrets.token_urlsafe(100) for _ in child_user_ids]
+        Child.objects.bulk_create(
+            (
+                Child(
+                    ChildUser_id=user_id,
+                    FatherUser_id=father_ids[i // 2],
+                    key=keys[i],
+                    lookup=get_encryption().lookup_token(keys[i]),
+                )
+                for i, user_id in enumerate(child_user_ids)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        child_ids = list(Child.objects.order_by("ChildUser_id").values_list("id", flat=True))
+
+        for offset in range(0, rows, BATCH_SIZE):
+            Notifications.objects.bulk_create(
+                Notifications(
+                    ChildUser_id=rng.choice(child_ids),
+                    dateOfNotification=start + timedelta(days=rng.randrange(days)),
+                    imageOfNotification=f"alerts/{offset + i}.png",
+                )
+                for i in range(min(BATCH_SIZE, rows - offset))
+            )
+        MostUseApps.objects.bulk_create(
+            (
+                MostUseApps(ChildUser_id=child_id, appName=f"app{j}", hour=clock(rng.randrange(24), rng.randrange(60)))
+                for child_id in child_ids
+                for j in range(10)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        Notification.objects.bulk_create(
+            (
+                Notification(user_id=rng.choice(father_ids), message="بلاغ", is_read=rng.random() < 0.9)
+                for _ in range(rows // 10)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        self.analyze()
+        return {
+            "fathers": father_ids,
+            "keys": keys,
+            "links": [(father_ids[i // 2], user_id) for i, user_id in enumerate(child_user_ids)],
+            "start": start,
+            "days": days,
+            "max_id": Notifications.objects.order_by("-id").values_list("id", flat=True).first(),
+        }
+
+    def analyze(self):
+        # إحصائيات حديثة لمخطط الاستعلامات
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def measure(self, queries, options):
+        """
+        :return: {name: (plan, median ms, p95 ms)}
+        """
+        results = {}
+        for name, build in queries:
+            rng = random.Random(options["seed"])
+            plan = build(rng).explain()
+            timings = []
+            for _ in range(options["repeat"]):
+                queryset = build(rng)
+                t = time.perf_counter()
+                list(queryset)
+                timings.append((time.perf_counter() - t) * 1000)
+            timings.sort()
+            results[name] = (plan, statistics.median(timings), timings[int(len(timings) * 0.95) - 1])
+        return results
+
+    def report(self, queries, before, after):
+        self.stdout.write(
+            f"\n{'query':32}{'before ms':>12}{'p95':>9}{'after ms':>12}{'p95':>9}{'speedup':>10}"
+        )
+        for name, _ in queries:
+            (_, b50, b95), (_, a50, a95) = before[name], after[name]
+            self.stdout.write(
+                f"{name:32}{b50:12.3f}{b95:9.3f}{a50:12.3f}{a95:9.3f}{b50 / a50:9.1f}x"
+            )
+        for name, _ in queries:
+            self.stdout.write(f"\n{name}\n  before:")
+            for line in before[name][0].splitlines():
+                self.stdout.write(f"    {line}")
+            self.stdout.write("  after:")
+            for line in after[name][0].splitlines():
+                self.stdout.write(f"    {line}")
@@ -0,0 +1,151 @@
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.db import OperationalError, connection
+from django.test.utils import override_settings
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs concurrent usage reports, screenshot alerts and feed reads against a throwaway "
+        "copy of the configured database and reports throughput, latency and lock errors. "
+        "Run it once per backend to compare them, e.g. with a local PostgreSQL stand-in: "
+        "docker run -d -p 5432:5432 -e POSTGRES_USER=blockcontent -e POSTGRES_PASSWORD=blockcontent "
+        "postgres:16, then DB_ENGINE=postgres DB_PASSWORD=blockcontent python manage.py db_load_test"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=16, help="Concurrent writers")
+        parser.add_argument("--seconds", type=float, default=10, help="Duration of the run")
+        parser.add_argument("--children", type=int, default=100, help="Seeded child devices")
+        parser.add_argument(
+            "--sqlite-defaults",
+            action="store_true",
+            help="Ignore the SQLite OPTIONS (busy timeout, WAL with DB_SQLITE_WAL=1) to measure "
+            "the default journal",
+        )
+
+    def handle(self, *args, **options):
+        settings_dict = connection.settings_dict
+        old_name = settings_dict["NAME"]
+        if connection.vendor == "sqlite":
+            # ملف حقيقي بدلا من الذاكرة حتى تتنافس الاتصالات على نفس القفل
+            settings_dict["TEST"]["NAME"] = os.path.join(tempfile.mkdtemp(), "load_test.sqlite3")
+            if options["sqlite_defaults"]:
+                settings_dict["OPTIONS"] = {}
+        connection.close()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        # التنبيهات الوهمية بدون صور، لا داعي لإنشاء صور مصغرة لها
+        thumbnails = {**settings.NOTIFICATION_THUMBNAILS, "ENABLED": False}
+        try:
+            with override_settings(NOTIFICATION_THUMBNAILS=thumbnails):
+                children = self.seed(options["children"])
+                timings, errors = self.run(children, options)
+            self.report(timings, errors, options)
+        finally:
+            if connection.vendor == "postgresql":
+                # اتصالات الخيوط الخلفية (تجميع التنبيهات، مجمع الاتصالات) تمنع حذف القاعدة
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT pg_terminate_backend(pid, 5000) FROM pg_stat_activity "
+                        "WHERE datname = current_database() AND pid <> pg_backend_pid()"
+                    )
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def seed(self, count):
+        from api.models import Child, CustomUser
+
+        CustomUser.objects.bulk_create(
+            [
+                CustomUser(username=f"{kind}{i}", first_name=kind, last_name=str(i), userType=user_type, password="!")
+                for i in range(count)
+                for kind, user_type in (("father", "0"), ("child", "1"))
+            ]
+        )
+        fathers = dict(CustomUser.objects.filter(userType="0").values_list("username", "id"))
+        Child.objects.bulk_create(
+            [
+                Child(ChildUser=user, FatherUser_id=fathers[f"father{user.username[5:]}"], key=user.username)
+                for user in CustomUser.objects.filter(userType="1")
+            ]
+        )
+        return list(Child.objects.select_related("ChildUser", "FatherUser"))
+
+    def run(self, children, options):
+        from api.models import Notifications
+        from api.notifications import get_aggregator, mark_all_read
+        from api.usage import record_usage
+
+        def usage_report(rng, child):
+            record_usage(child, {f"app{j}": rng.randrange(600) for j in range(10)})
+
+        def alert(rng, child):
+            Notifications.objects.create(ChildUser=child, imageOfNotification="alerts/load.png")
+
+        def read_feed(rng, child):
+            mark_all_read(child.FatherUser)
+            list(Notifications.objects.filter(ChildUser__FatherUser=child.FatherUser)[:20])
+
+        operations = [(usage_report, 6), (alert, 2), (read_feed, 2)]
+        timings, errors = defaultdict(list), defaultdict(int)
+        lock = threading.Lock()
+        deadline = time.monotonic() + options["seconds"]
+
+        def worker(seed):
+            rng = random.Random(seed)
+            local, failed = defaultdict(list), defaultdict(int)
+            while time.monotonic() < deadline:
+                operation = rng.choices(
+                    [op for op, _ in operations], [weight for _, weight in operations]
+                )[0]
+                t = time.perf_counter()
+                try:
+                    operation(rng, rng.choice(children))
+                except OperationalError:  # database is locked
+                    failed[operation.__name__] += 1
+                    continue
+                local[operation.__name__].append((time.perf_counter() - t) * 1000)
+            connection.close()
+            with lock:
+                for name, values in local.items():
+                    timings[name] += values
+                for name, value in failed.items():
+                    errors[name] += value
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(options["workers"])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if settings.ALERT_AGGREGATION["ENABLED"]:
+            get_aggregator().flush()  # التنبيهات المتبقية في الذاكرة
+        return timings, errors
+
+    def report(self, timings, errors, options):
+        total = sum(len(values) for values in timings.values())
+        engine = connection.vendor
+        if connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                cursor.execute("PRAGMA journal_mode")
+                journal = cursor.fetchone()[0]
+            engine += f" ({journal} journal, {'default' if options['sqlite_defaults'] else 'configured'} options)"
+        self.stdout.write(
+            f"{engine}: {options['workers']} workers, {total} operations in "
+            f"{options['seconds']:.0f}s = {total / options['seconds']:.1f} ops/s, "
+            f"{sum(errors.values())} lock errors"
+        )
+        self.stdout.write(f"{'operation':16}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        for name in sorted(set(timings) | set(errors)):
+            values = sorted(timings[name]) or [0.0]
+            self.stdout.write(
+                f"{name:16}{len(timings[name]):8}{statistics.median(values):10.1f}"
+                f"{values[int(len(values) * 0.95) - 1]:10.1f}{values[int(len(values) * 0.99) - 1]:10.1f}"
+                f"{errors[name]:8}"
+            )
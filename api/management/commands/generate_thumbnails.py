@@ -0,0 +1,31 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates the missing thumbnails of notification images, for notifications created "
+        "before thumbnails existed or whose background generation was interrupted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Parallel threads")
+
+    def handle(self, *args, **options):
+        from api.models import Notifications
+        from api.thumbnails import _run
+
+        ids = list(
+            Notifications.objects.filter(thumbnail="")
+            .exclude(imageOfNotification="")
+            .values_list("id", flat=True)
+        )
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            for done, _ in enumerate(executor.map(_run, ids), 1):
+                if done % 1000 == 0:
+                    self.stdout.write(f"{done}/{len(ids)}")
+        self.stdout.write(
+            f"Thumbnails: {Notifications.objects.exclude(thumbnail='').count()} stored, "
+            f"{len(ids)} processed"
+        )
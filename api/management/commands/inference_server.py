@@ -0,0 +1,42 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the content model inference pool of this node: core-pinned processes loading the "
+        "model once each, reached by every web and analysis worker through a local socket."
+    )
+
+    def add_arguments(self, parser):
+        config = settings.CONTENT_INFERENCE_POOL
+        parser.add_argument(
+            "--workers", type=int, default=config["WORKERS"], help="Inference processes"
+        )
+        parser.add_argument(
+            "--slots", type=int, default=config["SLOTS"], help="Shared-memory image slots"
+        )
+
+    def handle(self, *args, **options):
+        from api.detect import content_model_weights
+        from api.inference_pool import InferencePool, serve
+
+        config = settings.CONTENT_INFERENCE_POOL
+        pool = InferencePool(
+            content_model_weights(),
+            device=settings.CONTENT_MODEL_DEVICE or "cpu",
+            workers=options["workers"],
+            slots=options["slots"],
+            imgsz=settings.CONTENT_MODEL_IMGSZ,
+            timeout=config["TIMEOUT"],
+        )
+        # الإيقاف من مدير الخدمات يحرر الذاكرة المشتركة والمقبس
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        try:
+            serve(pool, config["ADDRESS"])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            pool.close()
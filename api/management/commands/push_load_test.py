@@ -0,0 +1,201 @@
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+
+def _rss_mb():
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+class Stream:
+    """
+    One SSE client driving the ASGI application directly, without sockets.
+    """
+
+    def __init__(self, application, path, token, user_id):
+        self.application = application
+        self.user_id = user_id
+        self.scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [
+                (b"host", b"localhost"),
+                (b"accept", b"text/event-stream"),
+                (b"authorization", f"Bearer {token}".encode()),
+            ],
+            "client": ("127.0.0.1", 0),
+            "server": ("localhost", 80),
+        }
+        self.status = None
+        self.opened = asyncio.Event()
+        self.closed = asyncio.Event()
+        self.requested = False
+        self.pings = 0
+        self.received = {}  # notification id -> monotonic time
+        self.buffer = ""
+
+    async def receive(self):
+        if not self.requested:
+            self.requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await self.closed.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.status = message["status"]
+        elif message["type"] == "http.response.body":
+            self.buffer += message.get("body", b"").decode()
+            while "\n\n" in self.buffer:
+                event, self.buffer = self.buffer.split("\n\n", 1)
+                if event.startswith("retry:"):
+                    self.opened.set()
+                elif event.startswith(": ping"):
+                    self.pings += 1
+                elif event.startswith("id: "):
+                    self.received[int(event[4:].split("\n", 1)[0])] = time.monotonic()
+
+    async def run(self):
+        await self.application(self.scope, self.receive, self.send)
+
+
+class Command(BaseCommand):
+    help = (
+        "Opens thousands of idle notification streams against the ASGI application of this "
+        "process, on a throwaway copy of the database, and reports the memory per stream, "
+        "heartbeat delivery, push latency of new notifications and clean disconnection."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connections", type=int, default=2000, help="Open streams")
+        parser.add_argument("--parents", type=int, default=200, help="Parents sharing them")
+        parser.add_argument("--alerts", type=int, default=20, help="Notifications pushed")
+        parser.add_argument(
+            "--idle", type=float, default=5, help="Seconds of idling, heartbeat every second"
+        )
+
+    def handle(self, *args, **options):
+        settings_dict = connection.settings_dict
+        old_name = settings_dict["NAME"]
+        if connection.vendor == "sqlite":
+            # ملف حقيقي بدلا من الذاكرة حتى تراه خيوط الاستعلامات
+            settings_dict["TEST"]["NAME"] = os.path.join(tempfile.mkdtemp(), "push_test.sqlite3")
+        connection.close()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            pairs = self.seed(options["parents"])
+            push_channel = {
+                "HEARTBEAT": 1,
+                "QUEUE_SIZE": 100,
+                "WATCH_INTERVAL": 1,
+                "WATCH_OVERLAP": 5,
+                "MAX_CONNECTIONS": options["connections"],
+                "RETRY_MS": 5000,
+                "REPLAY_LIMIT": 100,
+            }
+            with override_settings(PUSH_CHANNEL=push_channel, ALLOWED_HOSTS=["localhost"]):
+                asyncio.run(self.run(pairs, options))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def seed(self, count):
+        from api.authentication import tokens_for
+        from api.models import Child, CustomUser
+
+        CustomUser.objects.bulk_create(
+            [
+                CustomUser(username=f"{kind}{i}", first_name=kind, last_name=str(i), userType=user_type, password="!")
+                for i in range(count)
+                for kind, user_type in (("father", "0"), ("child", "1"))
+            ]
+        )
+        fathers = dict(CustomUser.objects.filter(userType="0").values_list("username", "id"))
+        Child.objects.bulk_create(
+            [
+                Child(ChildUser=user, FatherUser_id=fathers[f"father{user.username[5:]}"], key=user.username)
+                for user in CustomUser.objects.filter(userType="1")
+            ]
+        )
+        return [
+            (str(tokens_for(child.FatherUser).access_token), child.FatherUser_id, child.id)
+            for child in Child.objects.select_related("FatherUser").order_by("id")
+        ]
+
+    async def run(self, pairs, options):
+        from asgiref.sync import sync_to_async
+        from django.core.asgi import get_asgi_application
+        from django.urls import reverse
+        from api.notifications import write_alerts
+        from api.push import hub
+
+        application = get_asgi_application()
+        path = reverse("notificationsStream")
+        rss = _rss_mb()
+        streams = [
+            Stream(application, path, token, father)
+            for token, father, _ in (pairs[i % len(pairs)] for i in range(options["connections"]))
+        ]
+        t = time.perf_counter()
+        tasks = [asyncio.create_task(stream.run()) for stream in streams]
+        await asyncio.wait_for(
+            asyncio.gather(*(stream.opened.wait() for stream in streams)), timeout=120
+        )
+        opened = time.perf_counter() - t
+        self.stdout.write(
+            f"{hub.connections} streams open in {opened:.1f}s, "
+            f"{(_rss_mb() - rss) * 1024 / len(streams):.1f} KB per stream"
+        )
+
+        await asyncio.sleep(options["idle"])
+        pings = sorted(stream.pings for stream in streams)
+        self.stdout.write(
+            f"idle {options['idle']:.0f}s: heartbeats per stream min {pings[0]}, "
+            f"median {statistics.median(pings):.0f}"
+        )
+
+        sent = {}
+        for i in range(options["alerts"]):
+            _, father, child = pairs[i % len(pairs)]
+            t = time.monotonic()
+            created = await sync_to_async(write_alerts)({(father, child): 1})
+            sent[created[0].id] = (father, t)
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(2)
+        latencies, missing = [], 0
+        for stream in streams:
+            for notification_id, (father, t) in sent.items():
+                if father != stream.user_id:
+                    continue
+                if notification_id in stream.received:
+                    latencies.append((stream.received[notification_id] - t) * 1000)
+                else:
+                    missing += 1
+        latencies.sort()
+        if latencies:
+            self.stdout.write(
+                f"{options['alerts']} notifications: {len(latencies)} deliveries, {missing} missing, "
+                f"p50 {statistics.median(latencies):.1f} ms, "
+                f"p95 {latencies[int(len(latencies) * 0.95) - 1]:.1f} ms"
+            )
+
+        for stream in streams:
+            stream.closed.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.stdout.write(f"after disconnecting: {hub.connections} streams open")
@@ -0,0 +1,118 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date, parse_etags, quote_etag
+from django.views import View
+from .storage import content_storage
+
+CHUNK_SIZE = 64 * 1024
+# اسم الملف في التخزين المعنون بالمحتوى هو بصمة محتواه، فلا يتغير أبدا
+CONTENT_ADDRESSED = re.compile(r"(?:^|/)[0-9a-f]{2}/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})\.\w+$")
+RANGE = re.compile(r"^bytes=(?P<start>\d*)-(?P<end>\d*)$")
+
+
+def parse_range(header, size):
+    """
+    Reads a single-range Range header.
+    :return: (start, end) inclusive, None for a header to ignore (missing or multiple
+        ranges, answered with the whole file).
+    :raises ValueError: When the range cannot be satisfied.
+    """
+    match = RANGE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    start, end = match["start"], match["end"]
+    if not start:
+        if not end:
+            return None
+        # آخر n بايت
+        length = int(end)
+        if length == 0:
+            raise ValueError(header)
+        return max(0, size - length), size - 1
+    start, end = int(start), min(int(end) if end else size - 1, size - 1)
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, "rb") as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+class MediaView(View):
+    """
+    Serves uploaded images from MEDIA_ROOT.
+    Content-addressed files get their digest as a strong ETag and are cached as immutable;
+    older files get an ETag from their size and modification time. Single byte ranges are
+    answered with 206. With MEDIA_SERVING["MODE"] set to "x-accel" (nginx) or "x-sendfile"
+    (Apache, lighttpd) the proxy copies the bytes and handles ranges itself.
+    """
+
+    def get(self, request, name):
+        config = settings.MEDIA_SERVING
+        storage = content_storage()
+        try:
+            path = storage.path(name)
+        except SuspiciousFileOperation:
+            raise Http404
+        if name.startswith(".tmp/") or not os.path.isfile(path):
+            raise Http404
+        stat = os.stat(path)
+
+        digest = CONTENT_ADDRESSED.search(name)
+        if digest:
+            etag = quote_etag(digest["digest"])
+            cache_control = f"public, max-age={config['IMMUTABLE_MAX_AGE']}, immutable"
+        else:
+            etag = f'W/"{stat.st_size:x}-{int(stat.st_mtime):x}"'
+            cache_control = f"public, max-age={config['MAX_AGE']}"
+        headers = {
+            "ETag": etag,
+            "Cache-Control": cache_control,
+            "Last-Modified": http_date(stat.st_mtime),
+            "Accept-Ranges": "bytes",
+        }
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            return HttpResponse(status=304, headers=headers)
+
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if config["MODE"] == "x-accel":
+            headers["X-Accel-Redirect"] = config["X_ACCEL_PREFIX"].rstrip("/") + "/" + name
+            return HttpResponse(content_type=content_type, headers=headers)
+        if config["MODE"] == "x-sendfile":
+            headers["X-Sendfile"] = path
+            return HttpResponse(content_type=content_type, headers=headers)
+
+        byte_range = None
+        # If-Range: النطاق صالح فقط إذا لم يتغير الملف منذ الجزء السابق
+        if request.headers.get("If-Range", etag) == etag:
+            try:
+                byte_range = parse_range(request.headers.get("Range"), stat.st_size)
+            except ValueError:
+                return HttpResponse(
+                    status=416, headers={**headers, "Content-Range": f"bytes */{stat.st_size}"}
+                )
+        if byte_range is None:
+            response = FileResponse(open(path, "rb"), content_type=content_type)
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                _read_range(path, start, end - start + 1), status=206, content_type=content_type
+            )
+            response["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+            response["Content-Length"] = str(end - start + 1)
+        for header, value in headers.items():
+            response[header] = value
+        return response
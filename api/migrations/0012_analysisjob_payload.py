@@ -0,0 +1,42 @@
+# Generated by Django 5.1.5 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+def copy_images_to_payload(apps, schema_editor):
+    AnalysisJob = apps.get_model("api", "AnalysisJob")
+    for job in AnalysisJob.objects.filter(status__in=("pending", "running")):
+        try:
+            with job.image.open("rb") as f:
+                job.payload = f.read()
+        except (OSError, ValueError):
+            job.status = "failed"
+            job.error = "image file missing"
+        job.filename = job.image.name.rsplit("/", 1)[-1]
+        job.save(update_fields=["payload", "filename", "status", "error"])
+        job.image.delete(save=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_analysisjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisjob',
+            name='payload',
+            field=models.BinaryField(default=b'', verbose_name='الصورة'),
+        ),
+        migrations.AddField(
+            model_name='analysisjob',
+            name='filename',
+            field=models.CharField(blank=True, default='', max_length=255, verbose_name='اسم الملف'),
+        ),
+        migrations.RunPython(copy_images_to_payload, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='analysisjob',
+            name='image',
+        ),
+    ]
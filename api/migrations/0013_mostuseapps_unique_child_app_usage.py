@@ -0,0 +1,30 @@
+# Generated by Django 5.1.5 on 2026-10-18 18:05
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def remove_duplicate_usage(apps, schema_editor):
+    # Keep the latest row of each (ChildUser, appName) before adding the constraint
+    MostUseApps = apps.get_model("api", "MostUseApps")
+    latest = (
+        MostUseApps.objects.values("ChildUser", "appName")
+        .annotate(latest_id=Max("id"))
+        .values_list("latest_id", flat=True)
+    )
+    MostUseApps.objects.exclude(id__in=list(latest)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_analysisjob_payload'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_usage, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='mostuseapps',
+            constraint=models.UniqueConstraint(fields=('ChildUser', 'appName'), name='unique_child_app_usage'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.1.5 on 2026-10-18 15:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_mostuseapps_unique_child_app_usage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsageApp',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='اسم التطبيق')),
+            ],
+            options={
+                'verbose_name': 'تطبيق',
+                'verbose_name_plural': 'التطبيقات',
+            },
+        ),
+        migrations.CreateModel(
+            name='UsageDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='اليوم')),
+                ('minutes', models.PositiveIntegerField(default=0, verbose_name='دقائق الاستخدام')),
+                ('ChildUser', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.child', verbose_name='الابن')),
+                ('app', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.usageapp', verbose_name='التطبيق')),
+            ],
+            options={
+                'verbose_name': 'استخدام يومي',
+                'verbose_name_plural': 'الاستخدام اليومي',
+                'constraints': [models.UniqueConstraint(fields=('ChildUser', 'day', 'app'), name='unique_daily_usage')],
+            },
+        ),
+        migrations.CreateModel(
+            name='UsageHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='الساعة')),
+                ('minutes', models.PositiveIntegerField(default=0, verbose_name='دقائق الاستخدام')),
+                ('ChildUser', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.child', verbose_name='الابن')),
+                ('app', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.usageapp', verbose_name='التطبيق')),
+            ],
+            options={
+                'verbose_name': 'استخدام بالساعة',
+                'verbose_name_plural': 'الاستخدام بالساعة',
+                'constraints': [models.UniqueConstraint(fields=('ChildUser', 'hour', 'app'), name='unique_hourly_usage')],
+            },
+        ),
+        migrations.CreateModel(
+            name='UsageSample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='اليوم')),
+                ('recorded_at', models.DateTimeField(verbose_name='وقت التقرير')),
+                ('data', models.BinaryField(verbose_name='البيانات')),
+                ('ChildUser', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.child', verbose_name='الابن')),
+            ],
+            options={
+                'verbose_name': 'تقرير استخدام',
+                'verbose_name_plural': 'تقارير الاستخدام',
+                'indexes': [models.Index(fields=['ChildUser', 'day'], name='api_usagesa_ChildUs_918a71_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.5 on 2026-10-18 15:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_unread(apps, schema_editor):
+    Notification = apps.get_model("api", "Notification")
+    NotificationCounter = apps.get_model("api", "NotificationCounter")
+    NotificationCounter.objects.bulk_create(
+        NotificationCounter(user_id=row["user"], unread=row["unread"])
+        for row in Notification.objects.filter(is_read=False)
+        .values("user")
+        .annotate(unread=Count("id"))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_usage_time_series'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notification_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('unread', models.PositiveIntegerField(default=0, verbose_name='غير المقروءة')),
+            ],
+            options={
+                'verbose_name': 'عداد الاشعارات',
+                'verbose_name_plural': 'عدادات الاشعارات',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'is_read', 'created_at'], name='api_notific_user_id_537f5a_idx'),
+        ),
+        migrations.RunPython(count_unread, migrations.RunPython.noop),
+    ]
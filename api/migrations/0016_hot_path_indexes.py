@@ -0,0 +1,25 @@
+# Generated by Django 5.1.5 on 2026-10-18 15:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_notification_counter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='child',
+            index=models.Index(fields=['key'], name='api_child_key_88220b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mostuseapps',
+            index=models.Index(fields=['ChildUser', '-hour'], name='api_mostuse_ChildUs_c47215_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notifications',
+            index=models.Index(fields=['ChildUser', '-dateOfNotification', '-id'], name='api_notific_ChildUs_7fc7c4_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.5 on 2026-10-18 15:48
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def fill_lookup(apps, schema_editor):
+    from api.crypto import get_encryption
+
+    Child = apps.get_model("api", "Child")
+    encryption = get_encryption()
+    batch = []
+    for child in Child.objects.filter(key__isnull=False).only("id", "key").iterator():
+        child.lookup = encryption.lookup_token(child.key)
+        batch.append(child)
+        if len(batch) == BATCH_SIZE:
+            Child.objects.bulk_update(batch, ["lookup"])
+            batch = []
+    Child.objects.bulk_update(batch, ["lookup"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='child',
+            name='api_child_key_88220b_idx',
+        ),
+        migrations.AddField(
+            model_name='child',
+            name='lookup',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='child',
+            index=models.Index(fields=['lookup'], name='api_child_lookup_76742b_idx'),
+        ),
+        migrations.RunPython(fill_lookup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.1.5 on 2026-10-18 15:52
+
+import re
+
+import api.storage
+from django.db import migrations, models
+
+IMAGE_FIELDS = (
+    ("CustomUser", "profileImage"),
+    ("Notifications", "imageOfNotification"),
+    ("MostUseApps", "imageOfApp"),
+)
+
+
+def relative_names(apps, schema_editor):
+    # المسارات القديمة مطلقة (BASE_DIR/uploads_images/...)، تحول إلى مسارات داخل MEDIA_ROOT
+    for model_name, field in IMAGE_FIELDS:
+        model = apps.get_model("api", model_name)
+        rows = model.objects.filter(**{f"{field}__contains": "uploads_images"})
+        for pk, name in rows.values_list("pk", field).iterator():
+            relative = re.split(r"uploads_images[\\/]", name)[-1].replace("\\", "/")
+            model.objects.filter(pk=pk).update(**{field: relative})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_child_key_lookup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='المسار')),
+                ('size', models.PositiveBigIntegerField(verbose_name='الحجم')),
+                ('refs', models.PositiveIntegerField(default=1, verbose_name='عدد المراجع')),
+            ],
+            options={
+                'verbose_name': 'ملف وسائط',
+                'verbose_name_plural': 'ملفات الوسائط',
+            },
+        ),
+        migrations.AlterField(
+            model_name='customuser',
+            name='profileImage',
+            field=models.ImageField(default='profileImages/guest-user.webp', max_length=1024, storage=api.storage.content_storage, upload_to='profileImages', verbose_name='صورة الملف الشخصي'),
+        ),
+        migrations.AlterField(
+            model_name='mostuseapps',
+            name='imageOfApp',
+            field=models.ImageField(blank=True, max_length=1024, null=True, storage=api.storage.content_storage, upload_to='appsIcon', verbose_name='ايقونة التطبيق'),
+        ),
+        migrations.AlterField(
+            model_name='notifications',
+            name='imageOfNotification',
+            field=models.ImageField(max_length=1024, storage=api.storage.content_storage, upload_to='notifications', verbose_name='صورة البلاغ'),
+        ),
+        migrations.RunPython(relative_names, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.5 on 2026-10-18 15:53
+
+import api.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_content_addressed_media'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notifications',
+            name='thumbnail',
+            field=models.ImageField(blank=True, editable=False, max_length=1024, storage=api.storage.content_storage, upload_to='thumbnails', verbose_name='صورة مصغرة'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.5 on 2026-10-18 15:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_notification_thumbnail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='child',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='alerts', to='api.child', verbose_name='الابن'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='count',
+            field=models.PositiveIntegerField(default=1, verbose_name='عدد البلاغات'),
+        ),
+    ]
@@ -7,79 +7,12 @@ from django.contrib.auth.models import (
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.utils import timezone
-from django.conf import settings
-import os
-import base64
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.primitives import padding
-from cryptography.hazmat.backends import default_backend
+import uuid
 from django.utils.translation import gettext_lazy as _
-from datetime import datetime
+from .crypto import get_encryption
+from .storage import content_storage
 
 currentTime = timezone.now  # Get the current time
-currentFilesTime = datetime.now()  # Get the current time
-
-
-class EncryptionHandler:
-    def __init__(self):
-        """
-        Initializes the encryption handler with the given key.
-        :param key: The key used for encryption (should be 16, 24, or 32 bytes for AES).
-        """
-        self.key = settings.SECRET_KEY.encode()[:32]
-        self.backend = default_backend()
-
-    def encrypt(self, data):
-        """
-        Encrypts the data using AES encryption and returns a Base64 encoded string.
-        :param data: The data to encrypt.
-        :return: The encrypted data as a Base64 string.
-        """
-        # Add padding to the data to ensure it's a multiple of the block size (AES block size is 128-bit = 16 bytes)
-        padder = padding.PKCS7(128).padder()
-        padded_data = padder.update(data.encode()) + padder.finalize()
-
-        # Generate a random IV (Initialization Vector)
-        iv = os.urandom(16)
-
-        # Create AES cipher object
-        cipher = Cipher(algorithms.AES(self.key), modes.CBC(iv), backend=self.backend)
-        encryptor = cipher.encryptor()
-
-        # Encrypt the data
-        ciphertext = encryptor.update(padded_data) + encryptor.finalize()
-
-        # Combine IV and ciphertext
-        encrypted_data = iv + ciphertext
-
-        # Convert encrypted data to Base64 and return
-        return base64.b64encode(encrypted_data).decode("utf-8")
-
-    def decrypt(self, base64_encrypted_data):
-        """
-        Decrypts the Base64 encoded encrypted data using AES decryption.
-        :param base64_encrypted_data: The encrypted data as a Base64 encoded string.
-        :return: The decrypted data (original message).
-        """
-        # Decode the Base64 encoded encrypted data
-        encrypted_data = base64.b64decode(base64_encrypted_data)
-
-        # Extract the IV and ciphertext from the encrypted data
-        iv = encrypted_data[:16]
-        ciphertext = encrypted_data[16:]
-
-        # Create AES cipher object
-        cipher = Cipher(algorithms.AES(self.key), modes.CBC(iv), backend=self.backend)
-        decryptor = cipher.decryptor()
-
-        # Decrypt the data
-        padded_data = decryptor.update(ciphertext) + decryptor.finalize()
-
-        # Remove padding
-        unpadder = padding.PKCS7(128).unpadder()
-        data = unpadder.update(padded_data) + unpadder.finalize()
-
-        return data.decode()  # Decode back to string
 
 
 # Custom manager for user management
@@ -159,8 +92,9 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
         null=False,
         blank=False,
         max_length=1024,
-        upload_to=f"{settings.BASE_DIR}/uploads_images/profileImages/{currentFilesTime.date()}/",
-        default=f"{settings.BASE_DIR}/uploads_images/profileImages/guest-user.webp",
+        upload_to="profileImages",
+        storage=content_storage,
+        default="profileImages/guest-user.webp",
     )  # Image associated with the notification
 
     objects = CustomUserManager()  # Assign custom user manager
@@ -213,6 +147,8 @@ class Child(models.Model):
     )  # Linking father with a user of type "Father"
 
     key = models.CharField(max_length=255, null=True, blank=True)
+    # بصمة المفتاح للبحث عنه عند ربط الطفل بالأب
+    lookup = models.CharField(max_length=64, null=True, blank=True, editable=False)
 
     def __str__(self):
         return f"{self.ChildUser.first_name}"  # Return the first name of the child
@@ -220,6 +156,7 @@ class Child(models.Model):
     class Meta:
         verbose_name = "طفل"  # Model name in admin interface
         verbose_name_plural = "الاطفال"  # Model name in plural form
+        indexes = [models.Index(fields=["lookup"])]  # Linking a child to a father
 
     def clean(self):
         if not self.ChildUser:
@@ -228,11 +165,12 @@ class Child(models.Model):
             )
 
     def save(self, *args, **kwargs):
-        encryption = EncryptionHandler()
+        encryption = get_encryption()
         if not self.key and self.ChildUser:
             self.key = encryption.encrypt(
                 f"{self.ChildUser.pk}|{self.ChildUser.username}"
             )
+        self.lookup = encryption.lookup_token(self.key) if self.key else None
 
         # استدعاء الحفظ الأساسي
         super().save(*args, **kwargs)
@@ -253,15 +191,29 @@ class Notifications(models.Model):
         null=False,
         blank=False,
         max_length=1024,
-        upload_to=f"{settings.BASE_DIR}/uploads_images/{currentFilesTime.date()}/",
+        upload_to="notifications",
+        storage=content_storage,
     )  # Image associated with the notification
 
+    thumbnail = models.ImageField(
+        verbose_name="صورة مصغرة",
+        blank=True,
+        editable=False,
+        max_length=1024,
+        upload_to="thumbnails",
+        storage=content_storage,
+    )  # Small WebP of the image for the feed, generated after the notification is created (api/thumbnails.py)
+
     def __str__(self):
         return f"{self.ChildUser.ChildUser.first_name}"  # Return the first name of the child in the notification
 
     class Meta:
         verbose_name = "بلاغ"  # Model name in admin interface
         verbose_name_plural = "البلاغات"  # Model name in plural form
+        indexes = [
+            # Notification feed pages, newest first
+            models.Index(fields=["ChildUser", "-dateOfNotification", "-id"])
+        ]
 
 
 # Most used apps model for a child
@@ -276,7 +228,8 @@ class MostUseApps(models.Model):
         null=True,
         blank=True,
         max_length=1024,
-        upload_to=f"{settings.BASE_DIR}/uploads_images/appsIcon/{currentFilesTime.date()}/",
+        upload_to="appsIcon",
+        storage=content_storage,
     )  # Image associated with the notification
 
     appName = models.CharField(
@@ -293,13 +246,103 @@ class MostUseApps(models.Model):
     class Meta:
         verbose_name = "تطبيق اكثر استخدام"  # Model name in admin interface
         verbose_name_plural = "التطبيقات الاكثر استخدام"  # Model name in plural form
+        indexes = [models.Index(fields=["ChildUser", "-hour"])]  # Most used first
+        constraints = [
+            # One usage row per app per child, updated in place by each report
+            models.UniqueConstraint(
+                fields=["ChildUser", "appName"], name="unique_child_app_usage"
+            )
+        ]
+
+
+# App names are stored once and referenced by id from the usage tables
+class UsageApp(models.Model):
+    name = models.CharField(verbose_name="اسم التطبيق", max_length=255, unique=True)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        verbose_name = "تطبيق"
+        verbose_name_plural = "التطبيقات"
+
+
+# Append-only usage report of a child: one row per report, partitioned by (child, day)
+class UsageSample(models.Model):
+    ChildUser = models.ForeignKey(
+        Child, verbose_name="الابن", on_delete=models.CASCADE
+    )
+    day = models.DateField(verbose_name="اليوم")
+    recorded_at = models.DateTimeField(verbose_name="وقت التقرير")
+    # Packed little-endian uint32 pairs (UsageApp id, minutes used today), see api/usage.py
+    data = models.BinaryField(verbose_name="البيانات")
+
+    def __str__(self):
+        return f"{self.ChildUser_id} / {self.recorded_at}"
+
+    class Meta:
+        verbose_name = "تقرير استخدام"
+        verbose_name_plural = "تقارير الاستخدام"
+        indexes = [models.Index(fields=["ChildUser", "day"])]
+
+
+# Minutes of use per app per hour, maintained incrementally when reports arrive
+class UsageHourly(models.Model):
+    ChildUser = models.ForeignKey(
+        Child, verbose_name="الابن", on_delete=models.CASCADE
+    )
+    app = models.ForeignKey(UsageApp, verbose_name="التطبيق", on_delete=models.CASCADE)
+    hour = models.DateTimeField(verbose_name="الساعة")
+    minutes = models.PositiveIntegerField(verbose_name="دقائق الاستخدام", default=0)
+
+    class Meta:
+        verbose_name = "استخدام بالساعة"
+        verbose_name_plural = "الاستخدام بالساعة"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["ChildUser", "hour", "app"], name="unique_hourly_usage"
+            )
+        ]
+
+
+# Minutes of use per app per day, the latest total reported by the device
+class UsageDaily(models.Model):
+    ChildUser = models.ForeignKey(
+        Child, verbose_name="الابن", on_delete=models.CASCADE
+    )
+    app = models.ForeignKey(UsageApp, verbose_name="التطبيق", on_delete=models.CASCADE)
+    day = models.DateField(verbose_name="اليوم")
+    minutes = models.PositiveIntegerField(verbose_name="دقائق الاستخدام", default=0)
+
+    class Meta:
+        verbose_name = "استخدام يومي"
+        verbose_name_plural = "الاستخدام اليومي"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["ChildUser", "day", "app"], name="unique_daily_usage"
+            )
+        ]
 
 
 class Notification(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    child = models.ForeignKey(
+        Child,
+        verbose_name="الابن",
+        on_delete=models.CASCADE,
+        related_name="alerts",
+        null=True,
+        blank=True,
+    )  # The child whose alerts are summarized
+    count = models.PositiveIntegerField(
+        verbose_name="عدد البلاغات", default=1
+    )  # Alerts coalesced into this notification (api/notifications.py)
     message = models.CharField(max_length=255)
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(
+        auto_now=True, db_index=True
+    )  # Last change of count/message, polled by the push watcher (api/push.py)
 
     def __str__(self):
         return self.user.first_name
@@ -307,3 +350,93 @@ class Notification(models.Model):
     class Meta:
         verbose_name = "اشعار"
         verbose_name_plural = "اشعارات"
+        # unread notifications of a user, newest first
+        indexes = [models.Index(fields=["user", "is_read", "created_at"])]
+
+
+# Number of unread notifications of a user, kept in step with Notification.is_read
+class NotificationCounter(models.Model):
+    user = models.OneToOneField(
+        CustomUser,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name="notification_counter",
+    )
+    unread = models.PositiveIntegerField(verbose_name="غير المقروءة", default=0)
+
+    def __str__(self):
+        return f"{self.user_id} / {self.unread}"
+
+    class Meta:
+        verbose_name = "عداد الاشعارات"
+        verbose_name_plural = "عدادات الاشعارات"
+
+
+# Screenshot analysis job, consumed by the analysis_workers command
+class AnalysisJob(models.Model):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    user = models.ForeignKey(
+        CustomUser, verbose_name="المستخدم", on_delete=models.CASCADE
+    )  # The child account that uploaded the screenshot
+
+    payload = models.BinaryField(
+        verbose_name="الصورة", default=b""
+    )  # Encoded screenshot waiting for analysis, cleared once the job is finished
+
+    filename = models.CharField(
+        verbose_name="اسم الملف", max_length=255, blank=True, default=""
+    )  # Original upload name, reused if the screenshot is stored on a notification
+
+    status = models.CharField(
+        verbose_name="الحالة",
+        choices=(
+            (PENDING, "في الانتظار"),
+            (RUNNING, "قيد التحليل"),
+            (DONE, "مكتمل"),
+            (FAILED, "فشل"),
+        ),
+        default=PENDING,
+        max_length=10,
+    )  # Job state
+
+    result = models.JSONField(
+        verbose_name="النتيجة", null=True, blank=True
+    )  # Detection result once the job is done
+
+    error = models.TextField(verbose_name="الخطأ", blank=True, default="")
+
+    attempts = models.PositiveSmallIntegerField(
+        verbose_name="عدد المحاولات", default=0
+    )  # Number of times a worker picked the job up
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.user.username} / {self.status}"
+
+    class Meta:
+        verbose_name = "مهمة تحليل"
+        verbose_name_plural = "مهام التحليل"
+        indexes = [models.Index(fields=["status", "created_at"])]
+
+
+# Reference count of a file of the content-addressed media storage (api/storage.py)
+class MediaBlob(models.Model):
+    name = models.CharField(verbose_name="المسار", max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(verbose_name="الحجم")
+    refs = models.PositiveIntegerField(verbose_name="عدد المراجع", default=1)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        verbose_name = "ملف وسائط"
+        verbose_name_plural = "ملفات الوسائط"
@@ -0,0 +1,206 @@
+import atexit
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from utils.general import LOGGER
+from .models import Child, Notification, NotificationCounter, Notifications
+from .push import hub
+
+
+def increment_unread(user_id, count=1):
+    """
+    Adds newly created notifications to the unread counter of a user.
+    """
+    updated = NotificationCounter.objects.filter(user_id=user_id).update(
+        unread=F("unread") + count
+    )
+    if not updated:
+        NotificationCounter.objects.get_or_create(user_id=user_id)
+        NotificationCounter.objects.filter(user_id=user_id).update(
+            unread=F("unread") + count
+        )
+
+
+def mark_all_read(user):
+    """
+    Marks every unread notification of a user as read with a single UPDATE
+    and takes them off the counter.
+    :return: The number of notifications marked as read.
+    """
+    count = Notification.objects.filter(user=user, is_read=False).update(is_read=True)
+    if count:
+        NotificationCounter.objects.filter(user=user).update(
+            unread=Greatest(F("unread") - count, Value(0))
+        )
+    return count
+
+
+def unread_count(user):
+    """
+    :return: The number of unread notifications of a user, read from the counter.
+    """
+    return (
+        NotificationCounter.objects.filter(user=user)
+        .values_list("unread", flat=True)
+        .first()
+        or 0
+    )
+
+
+def alert_message(child_name, count):
+    if count == 1:
+        return f"تم إنشاء {child_name} بنجاح."
+    return f"تم إنشاء {count} بلاغات لـ {child_name}."
+
+
+def write_alerts(events):
+    """
+    Writes a batch of alerts as parent notifications. The alerts of a (father, child) pair
+    are added to the unread notification of that pair created within ALERT_AGGREGATION
+    ["WINDOW"], or summarized in one new notification.
+    :param events: {(father id, child id): number of alerts}
+    :return: The created Notifications.
+    """
+    window = settings.ALERT_AGGREGATION["WINDOW"]
+    children = {child for _, child in events}
+    with transaction.atomic():
+        open_notifications = {
+            (notification.user_id, notification.child_id): notification
+            for notification in Notification.objects.select_for_update()
+            .filter(
+                user_id__in={father for father, _ in events},
+                child_id__in=children,
+                is_read=False,
+                created_at__gte=timezone.now() - window,
+            )
+            .order_by("created_at")
+        }
+        names = dict(
+            Child.objects.filter(id__in=children).values_list("id", "ChildUser__first_name")
+        )
+        updated, created = [], []
+        now = timezone.now()
+        for (father, child), count in events.items():
+            notification = open_notifications.get((father, child))
+            if notification is None:
+                created.append(
+                    Notification(
+                        user_id=father,
+                        child_id=child,
+                        count=count,
+                        message=alert_message(names.get(child), count),
+                    )
+                )
+            else:
+                notification.count += count
+                notification.message = alert_message(names.get(child), notification.count)
+                notification.updated_at = now  # bulk_update لا يطبق auto_now
+                updated.append(notification)
+        Notification.objects.bulk_update(updated, ["count", "message", "updated_at"])
+        Notification.objects.bulk_create(created)
+        # bulk_create لا يرسل إشارة الحفظ التي تحدث العداد؛ الترتيب الثابت يمنع
+        # الجمود بين عمليات تكتب عدادات نفس الآباء في نفس الوقت
+        for father, new in sorted(Counter(notification.user_id for notification in created).items()):
+            increment_unread(father, new)
+        # بث فوري للآباء المتصلين بهذه العملية
+        transaction.on_commit(lambda: hub.publish(created + updated))
+    return created
+
+
+class AlertAggregator:
+    """
+    Buffers alerts in memory and writes them with write_alerts() from a background thread,
+    every flush_interval seconds or as soon as max_pending (father, child) pairs wait.
+    A burst of detections costs a few queries per flush instead of a row per screenshot.
+    """
+
+    def __init__(self, flush_interval=2, max_pending=1000):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.pending = Counter()  # (father id, child id) -> alerts
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def add(self, father_id, child_id, count=1):
+        with self.lock:
+            self.pending[father_id, child_id] += count
+            full = len(self.pending) >= self.max_pending
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self._run, name="alert-aggregator", daemon=True
+                )
+                self.thread.start()
+        if full:
+            self.wakeup.set()
+
+    def flush(self):
+        """
+        Writes the buffered alerts now; they are kept for the next flush if writing fails.
+        """
+        with self.lock:
+            events, self.pending = self.pending, Counter()
+        if not events:
+            return []
+        try:
+            return write_alerts(events)
+        except Exception:
+            with self.lock:
+                self.pending.update(events)
+            raise
+
+    def _run(self):
+        while True:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                LOGGER.exception("Writing parent alerts failed")
+            finally:
+                close_old_connections()
+
+
+_aggregator = None
+_aggregator_lock = threading.Lock()
+
+
+def get_aggregator():
+    global _aggregator
+    with _aggregator_lock:
+        if _aggregator is None:
+            config = settings.ALERT_AGGREGATION
+            _aggregator = AlertAggregator(config["FLUSH_INTERVAL"], config["MAX_PENDING"])
+            atexit.register(_aggregator.flush)
+    return _aggregator
+
+
+def record_alert(father_id, child_id):
+    """
+    Reports a new alert (Notifications row) of a child to its father.
+    """
+    if not settings.ALERT_AGGREGATION["ENABLED"]:
+        write_alerts({(father_id, child_id): 1})
+        return
+    # يضاف للتجميع بعد تأكيد حفظ البلاغ
+    transaction.on_commit(lambda: get_aggregator().add(father_id, child_id))
+
+
+@receiver(post_save, sender=Notifications)
+def create_notification(sender, instance, created, **kwargs):
+    # الطفل قد لا يكون مرتبطا بأب بعد
+    if created and instance.ChildUser and instance.ChildUser.FatherUser_id:
+        record_alert(instance.ChildUser.FatherUser_id, instance.ChildUser_id)
+
+
+@receiver(post_save, sender=Notification)
+def count_unread_notification(sender, instance, created, **kwargs):
+    if created and not instance.is_read:
+        increment_unread(instance.user_id)
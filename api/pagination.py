@@ -0,0 +1,58 @@
+import base64
+import hashlib
+from datetime import date
+
+from django.db.models import Count, Max, Q
+from django.utils.http import quote_etag
+
+
+def encode_cursor(notification):
+    """
+    Opaque cursor of a notification's position in the feed, ordered by (date, id).
+    """
+    value = f"{notification.dateOfNotification.isoformat()}|{notification.id}"
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    :return: (date, id) of an encoded cursor.
+    :raises ValueError: When the cursor is malformed.
+    """
+    value = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    day, pk = value.split("|")
+    return date.fromisoformat(day), int(pk)
+
+
+def keyset_filter(queryset, cursor=None, since=None):
+    """
+    Restricts a notifications queryset to the rows older than cursor and newer than since.
+    Both bounds compare (dateOfNotification, id), so pages do not skip or repeat rows
+    when notifications are added between requests.
+    """
+    if cursor:
+        day, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(dateOfNotification__lt=day) | Q(dateOfNotification=day, id__lt=pk)
+        )
+    if since:
+        day, pk = decode_cursor(since)
+        queryset = queryset.filter(
+            Q(dateOfNotification__gt=day) | Q(dateOfNotification=day, id__gt=pk)
+        )
+    return queryset.order_by("-dateOfNotification", "-id")
+
+
+def feed_etag(queryset, *params):
+    """
+    Cheap ETag of a page: one aggregate query over the filtered rows, no serialization.
+    Adding or deleting a notification in range changes the count or the latest id; a
+    thumbnail generated after the notification was committed changes the thumbnail count.
+    """
+    state = queryset.aggregate(
+        count=Count("id"), latest=Max("id"), thumbnails=Count("id", filter=~Q(thumbnail=""))
+    )
+    key = "|".join(
+        str(value) for value in (*params, state["count"], state["latest"], state["thumbnails"])
+    )
+    return quote_etag(hashlib.md5(key.encode()).hexdigest())
@@ -0,0 +1,218 @@
+import asyncio
+import json
+from collections import deque
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from .authentication import ClaimsJWTAuthentication
+from .models import Notification
+
+
+def serialize(notification):
+    from .serializers import NotificationSerializer
+
+    return dict(NotificationSerializer(notification).data)
+
+
+class Subscription:
+    """
+    One open stream: a bounded queue of events for one user.
+    """
+
+    __slots__ = ("user_id", "queue", "overflowed")
+
+    def __init__(self, user_id, size):
+        self.user_id = user_id
+        self.queue = asyncio.Queue(size)
+        self.overflowed = False
+
+
+class PushHub:
+    """
+    In-process publish/subscribe of parent notifications for the event streams of one
+    ASGI worker. Notifications written in this process are published right after their
+    commit (api/notifications.py); a single watcher task also polls for notifications
+    created or updated by other processes through Notification.updated_at, one query per
+    WATCH_INTERVAL however many parents are connected. Each poll reads WATCH_OVERLAP
+    seconds again, for transactions committed late and clock skew between servers; the
+    (id, count) of delivered events drops what was already sent. A client too slow to
+    drain its queue gets a "resync" event and is disconnected instead of holding memory.
+    """
+
+    def __init__(self):
+        self.subscribers = {}  # user id -> {Subscription}
+        self.loop = None
+        self.watcher = None
+        self.since = None  # updated_at of the newest notification seen by the watcher
+        self.recent = deque(maxlen=10000)  # (id, count) already delivered
+        self.recent_keys = set()
+
+    @property
+    def connections(self):
+        return sum(len(subscriptions) for subscriptions in self.subscribers.values())
+
+    def subscribe(self, user_id):
+        self.loop = asyncio.get_running_loop()
+        subscription = Subscription(user_id, settings.PUSH_CHANNEL["QUEUE_SIZE"])
+        self.subscribers.setdefault(user_id, set()).add(subscription)
+        if self.watcher is None or self.watcher.done() or self.watcher.get_loop() is not self.loop:
+            self.watcher = self.loop.create_task(self._watch())
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscriptions = self.subscribers.get(subscription.user_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self.subscribers[subscription.user_id]
+
+    def publish(self, notifications):
+        """
+        Delivers created or updated notifications to the connected parents.
+        Safe to call from any thread; does nothing when no stream was opened in this process.
+        """
+        loop = self.loop
+        if loop is None or loop.is_closed() or not notifications:
+            return
+        events = [serialize(notification) for notification in notifications]
+        loop.call_soon_threadsafe(self._deliver, events)
+
+    def _deliver(self, events):
+        for event in events:
+            key = (event["id"], event["count"])
+            if key in self.recent_keys:
+                continue
+            if len(self.recent) == self.recent.maxlen:
+                self.recent_keys.discard(self.recent[0])
+            self.recent.append(key)
+            self.recent_keys.add(key)
+            for subscription in tuple(self.subscribers.get(event["user"], ())):
+                if subscription.overflowed:
+                    continue
+                try:
+                    subscription.queue.put_nowait(event)
+                except asyncio.QueueFull:
+                    subscription.overflowed = True
+
+    async def _watch(self):
+        config = settings.PUSH_CHANNEL
+        overlap = timedelta(seconds=config["WATCH_OVERLAP"])
+        try:
+            if self.since is None:
+                self.since = await sync_to_async(_latest_change)()
+            while self.subscribers:
+                await asyncio.sleep(config["WATCH_INTERVAL"])
+                events, newest = await sync_to_async(_changed_events)(self.since - overlap)
+                if newest is not None and newest > self.since:
+                    self.since = newest
+                self._deliver(events)
+        finally:
+            # لا أحد متصل: البحث يبدأ من آخر تغيير عند الاتصال التالي
+            self.since = None
+
+
+def _latest_change():
+    latest = Notification.objects.order_by("-updated_at").values_list("updated_at", flat=True).first()
+    return latest or timezone.now()
+
+
+def _changed_events(after, page_size=1000):
+    """
+    Reads the notifications changed since a time, page by page in (updated_at, id) order.
+    :return: ([event], updated_at of the newest one or None)
+    """
+    events, newest = [], None
+    changed = Notification.objects.filter(updated_at__gte=after).order_by("updated_at", "id")
+    while True:
+        page = list(changed[:page_size])
+        events += [serialize(notification) for notification in page]
+        if page:
+            newest = page[-1].updated_at
+        if len(page) < page_size:
+            return events, newest
+        changed = changed.filter(Q(updated_at__gt=newest) | Q(updated_at=newest, id__gt=page[-1].id))
+
+
+def _missed_events(user_id, last_event_id):
+    limit = settings.PUSH_CHANNEL["REPLAY_LIMIT"]
+    notifications = Notification.objects.filter(user_id=user_id, id__gt=last_event_id)
+    return [serialize(notification) for notification in notifications.order_by("id")[:limit]]
+
+
+hub = PushHub()
+
+
+def _format(event):
+    return f"id: {event['id']}\nevent: notification\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+async def _events(user_id, last_event_id):
+    config = settings.PUSH_CHANNEL
+    subscription = hub.subscribe(user_id)
+    try:
+        yield f"retry: {config['RETRY_MS']}\n\n"
+        # ما فات العميل منذ انقطاع الاتصال، قد يتكرر مع البث والعميل يميزه بالمعرف
+        if last_event_id is not None:
+            for event in await sync_to_async(_missed_events)(user_id, last_event_id):
+                yield _format(event)
+        while True:
+            if subscription.overflowed:
+                yield "event: resync\ndata: {}\n\n"
+                return
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), config["HEARTBEAT"])
+            except asyncio.TimeoutError:
+                # يبقي الاتصال حيا عبر الوسطاء ويكشف العملاء المنقطعين
+                yield ": ping\n\n"
+                continue
+            yield _format(event)
+    finally:
+        hub.unsubscribe(subscription)
+
+
+def _authenticate(request):
+    authentication = ClaimsJWTAuthentication()
+    header = authentication.get_header(request)
+    # EventSource في المتصفح لا يرسل الهيدر، التوكن يمرر في الرابط
+    raw_token = (
+        authentication.get_raw_token(header) if header else request.GET.get("token", "").encode()
+    )
+    if not raw_token:
+        return None
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+async def notification_stream(request):
+    """
+    Server-Sent Events stream of the notifications of the authenticated parent.
+    Needs an ASGI server (blockContent/asgi.py); each idle connection is one coroutine.
+    Events carry the NotificationSerializer fields, their id is the notification id, so
+    a reconnecting EventSource resumes from Last-Event-ID.
+    """
+    user = await sync_to_async(_authenticate)(request)
+    if user is None:
+        return JsonResponse({"error": "بيانات الدخول غير صالحة"}, status=401)
+    if hub.connections >= settings.PUSH_CHANNEL["MAX_CONNECTIONS"]:
+        return JsonResponse(
+            {"error": "الخادم مشغول، حاول لاحقا"}, status=503, headers={"Retry-After": "10"}
+        )
+    try:
+        last_event_id = int(
+            request.headers.get("Last-Event-ID") or request.GET.get("lastEventId")
+        )
+    except (TypeError, ValueError):
+        last_event_id = None
+    response = StreamingHttpResponse(
+        _events(user.id, last_event_id), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # nginx يمرر الأحداث فورا
+    return response
@@ -1,75 +1,18 @@
 from rest_framework import serializers
-from .models import CustomUser, Child, Notifications, MostUseApps, Notification
-import os
-import base64
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.primitives import padding
-from cryptography.hazmat.backends import default_backend
+from .models import (
+    CustomUser,
+    Child,
+    Notifications,
+    MostUseApps,
+    Notification,
+    AnalysisJob,
+)
 from django.conf import settings
-from io import BytesIO
-from .detect import detect_image
-
-
-class EncryptionHandler:
-    def __init__(self):
-        """
-        Initializes the encryption handler with the given key.
-        :param key: The key used for encryption (should be 16, 24, or 32 bytes for AES).
-        """
-        self.key = settings.SECRET_KEY.encode()[:32]
-        self.backend = default_backend()
-
-    def encrypt(self, data):
-        """
-        Encrypts the data using AES encryption and returns a Base64 encoded string.
-        :param data: The data to encrypt.
-        :return: The encrypted data as a Base64 string.
-        """
-        # Add padding to the data to ensure it's a multiple of the block size (AES block size is 128-bit = 16 bytes)
-        padder = padding.PKCS7(128).padder()
-        padded_data = padder.update(data.encode()) + padder.finalize()
-
-        # Generate a random IV (Initialization Vector)
-        iv = os.urandom(16)
-
-        # Create AES cipher object
-        cipher = Cipher(algorithms.AES(self.key), modes.CBC(iv), backend=self.backend)
-        encryptor = cipher.encryptor()
-
-        # Encrypt the data
-        ciphertext = encryptor.update(padded_data) + encryptor.finalize()
-
-        # Combine IV and ciphertext
-        encrypted_data = iv + ciphertext
-
-        # Convert encrypted data to Base64 and return
-        return base64.b64encode(encrypted_data).decode("utf-8")
-
-    def decrypt(self, base64_encrypted_data):
-        """
-        Decrypts the Base64 encoded encrypted data using AES decryption.
-        :param base64_encrypted_data: The encrypted data as a Base64 encoded string.
-        :return: The decrypted data (original message).
-        """
-        # Decode the Base64 encoded encrypted data
-        encrypted_data = base64.b64decode(base64_encrypted_data)
-
-        # Extract the IV and ciphertext from the encrypted data
-        iv = encrypted_data[:16]
-        ciphertext = encrypted_data[16:]
-
-        # Create AES cipher object
-        cipher = Cipher(algorithms.AES(self.key), modes.CBC(iv), backend=self.backend)
-        decryptor = cipher.decryptor()
-
-        # Decrypt the data
-        padded_data = decryptor.update(ciphertext) + decryptor.finalize()
-
-        # Remove padding
-        unpadder = padding.PKCS7(128).unpadder()
-        data = unpadder.update(padded_data) + unpadder.finalize()
-
-        return data.decode()  # Decode back to string
+from .analysis import analyse_screenshot
+from .jobs import enqueue_job
+from .context import get_principal
+from .authentication import load_user
+from .crypto import get_encryption
 
 
 class CustomUserSerializer(serializers.ModelSerializer):
@@ -120,8 +63,6 @@ class CustomUserSerializer(serializers.ModelSerializer):
         },
     )
 
-    encryption = EncryptionHandler()
-
     class Meta:
         model = CustomUser
         fields = [
@@ -204,7 +145,7 @@ class NotificationsSerializer(serializers.ModelSerializer):
     child_last_name = serializers.CharField(
         source="ChildUser.ChildUser.last_name", read_only=True
     )
-    child_gender = serializers.CharField(source="ChildUser.gender", read_only=True)
+    child_gender = serializers.CharField(source="ChildUser.ChildUser.gender", read_only=True)
 
     class Meta:
         model = Notifications
@@ -216,12 +157,14 @@ class NotificationsSerializer(serializers.ModelSerializer):
             "child_last_name",
             "child_gender",
             "imageOfNotification",
+            "thumbnail",
         ]
         read_only_fields = [
             "id",
             "child_first_name",
             "child_last_name",
             "child_gender",
+            "thumbnail",
         ]
 
     # دالة create لتحفظ الكائن
@@ -258,8 +201,6 @@ class ChildSerializer(serializers.ModelSerializer):
     last_Connect = serializers.CharField(source="ChildUser.last_login", read_only=True)
     child_gender = serializers.CharField(source="ChildUser.gender", read_only=True)
 
-    encryption = EncryptionHandler()
-
     class Meta:
         model = Child
         fields = [
@@ -288,36 +229,31 @@ class ChildSerializer(serializers.ModelSerializer):
             key = data.get("key")
             if not key:
                 raise serializers.ValidationError({"key": "المفتاح الخاص بالطفل مطلوب"})
-            child = Child.objects.filter(key=key)
-            if not child.exists():
+            # بحث مفهرس ببصمة المفتاح، تطابق البصمة يثبت صحة المفتاح دون فك تشفيره
+            child = Child.objects.filter(lookup=get_encryption().lookup_token(key)).first()
+            if child is None:
                 raise serializers.ValidationError(
                     {"key": "المفتاح الذي تم ادخاله غير صحيح"}
                 )
-            if child.first().FatherUser == data["FatherUser"]:
+            if child.FatherUser_id == data["FatherUser"].id:
                 raise serializers.ValidationError(
                     {"key": "انت مرتبط بهذا الطفل بالفعل"}
                 )
-            if child.first().FatherUser:
+            if child.FatherUser_id:
                 raise serializers.ValidationError({"key": "هذا الطفل مرتبط بـ أب اخر"})
-            try:
-                key = self.encryption.decrypt(key)
-                newChild = child.first()
-                newChild.FatherUser = data["FatherUser"]
-                newChild.save()
-                data = newChild
-            except Exception as e:
-                raise serializers.ValidationError(
-                    {"key": f"فشل التحقق من المفتاح: {str(e)}"}
-                )
+            child.FatherUser = data["FatherUser"]
+            child.save()
+            data = child
 
         elif request_method == "DELETE":
             key = data.get("key")
             if not key:
                 raise serializers.ValidationError({"key": "الرجاء تحديد طفل اولا"})
-            child = Child.objects.filter(key=key, FatherUser=data["FatherUser"])
-            if not child.exists():
+            child = Child.objects.filter(
+                lookup=get_encryption().lookup_token(key), FatherUser=data["FatherUser"]
+            ).first()
+            if child is None:
                 raise serializers.ValidationError({"key": "الابن غير موجود"})
-            child = child.first()
             child.FatherUser = None
             child.save()
             data = child
@@ -327,61 +263,47 @@ class ChildSerializer(serializers.ModelSerializer):
 
 class ProfileImageSerializer(serializers.Serializer):
     Image = serializers.ImageField()
-    username = serializers.CharField()
 
     def validate(self, data):
-        user = CustomUser.objects.filter(username=data["username"]).first()
-        if not user:
-            raise serializers.ValidationError("اسم المستخدم غير صحيح")
+        # المستخدم محمل مسبقا من التوثيق
+        user = load_user(get_principal(self.context["request"]).user)
         user.profileImage = data["Image"]
-        user.save()
+        user.save(update_fields=["profileImage"])
         data["user"] = user
         return data
 
 
 class ImageContentAnalysisSerializer(serializers.Serializer):
     Image = serializers.ImageField()
-    username = serializers.CharField()
 
     def validate(self, data):
-        user = CustomUser.objects.filter(username=data["username"]).first()
-        if not user:
-            raise serializers.ValidationError("اسم المستخدم غير صحيح")
-
-        # تحويل الصورة إلى ملف في الذاكرة
+        user = get_principal(self.context["request"]).user
         image_file = data["Image"]
-        memory_file = BytesIO(image_file.read())
+        data["user"] = user
 
-        # تحديد مسار حفظ الصورة
-        save_path = os.path.join(settings.MEDIA_ROOT, "temp_images")
-        os.makedirs(save_path, exist_ok=True)  # إنشاء المجلد إذا لم يكن موجودًا
+        # وضع الصورة في طابور التحليل بدلا من تحليلها داخل الطلب
+        if settings.CONTENT_ANALYSIS_JOBS["ASYNC"]:
+            data["job"] = enqueue_job(user, image_file)
+            return data
 
-        # إنشاء اسم الملف بناءً على اسم المستخدم
-        filename = f"user_{user.id}_screenshot.png"
-        file_path = os.path.join(save_path, filename)
+        # تحليل الصورة من الذاكرة مباشرة بدون حفظها على القرص
+        image_file.seek(0)
+        data["result"] = analyse_screenshot(user, image_file.read(), image_file.name)
+        return data
 
-        # حفظ الصورة
-        with open(file_path, "wb") as f:
-            f.write(memory_file.getbuffer())
 
-        # تمرير المسار إلى البيانات
-        data["saved_file_path"] = file_path
-        data["user"] = user
-        result = detect_image(
-            weights="best.pt",
-            image_path=file_path,
-            conf_thres=0.35,
-            iou_thres=0.45,
-            device="cpu",
-        )
-        if result[0]:
-            notification = Notifications.objects.create(
-                ChildUser=Child.objects.filter(ChildUser=user).first(),
-                imageOfNotification=image_file,
-            )
-            notification.save()
-        print(result)
-        return data
+class AnalysisJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AnalysisJob
+        fields = [
+            "id",
+            "status",
+            "result",
+            "error",
+            "created_at",
+            "finished_at",
+        ]
+        read_only_fields = fields
 
 
 class UpdateUserSerializer(serializers.Serializer):
@@ -460,6 +382,7 @@ class UpdateUserSerializer(serializers.Serializer):
                 raise serializers.ValidationError({"password": "كلمة المرور غير صحيحة"})
             instance.set_password(validated_data["newPassword"])
 
+        # تغيير كلمة المرور يسجل الخروج من كل الأجهزة (بصمتها في التوكن)
         instance.save()
         return instance
 
@@ -468,7 +391,10 @@ class NotificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Notification
         fields = [
+            "id",
             "user",
+            "child",
+            "count",
             "message",
             "is_read",
             "created_at",
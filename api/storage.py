@@ -0,0 +1,142 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+from functools import cache
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+
+CHUNK_SIZE = 64 * 1024
+# حقول الصور المحفوظة بالتخزين المعنون بالمحتوى
+FILE_FIELDS = {
+    "api.CustomUser": ("profileImage",),
+    "api.Notifications": ("imageOfNotification", "thumbnail"),
+    "api.MostUseApps": ("imageOfApp",),
+}
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Names every file by the SHA-256 of its content, under two levels of shard directories:
+    <upload_to>/ab/cd/abcd…ef.png. A directory never holds more than 256 entries, so
+    listings and backups stay fast with millions of files.
+
+    Identical uploads share one file; MediaBlob counts the rows that reference it and the
+    file is removed when the last one is deleted. Files are written to a temporary file in
+    MEDIA_ROOT/.tmp and renamed into place, so readers never see a partial file.
+    Names saved before this storage (not in MediaBlob) are read as before and never deleted.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # الاسم النهائي يحدد من المحتوى عند الحفظ
+        return name
+
+    def _save(self, name, content):
+        directory, filename = posixpath.split(name.replace(os.sep, "/"))
+        tmp_dir = os.path.join(self.location, ".tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            digest, size = hashlib.sha256(), 0
+            with os.fdopen(fd, "wb") as tmp:
+                if hasattr(content, "seek"):
+                    content.seek(0)
+                for chunk in content.chunks(CHUNK_SIZE):
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+                tmp.flush()
+                os.fsync(tmp.fileno())
+
+            key = digest.hexdigest()
+            ext = os.path.splitext(filename)[1].lower()
+            name = posixpath.join(directory, key[:2], key[2:4], key + ext)
+            full_path = self.path(name)
+            with transaction.atomic():
+                # تحديث العداد يقفل السجل، فلا يحذف الملف أثناء حفظ نسخة أخرى منه
+                self._acquire(name, size)
+                if not os.path.exists(full_path):
+                    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                    if self.file_permissions_mode is not None:
+                        os.chmod(tmp_path, self.file_permissions_mode)
+                    os.replace(tmp_path, full_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return name
+
+    def _acquire(self, name, size):
+        MediaBlob = apps.get_model("api", "MediaBlob")
+        if MediaBlob.objects.filter(name=name).update(refs=F("refs") + 1):
+            return
+        try:
+            with transaction.atomic():
+                MediaBlob.objects.create(name=name, size=size)
+        except IntegrityError:
+            # نفس المحتوى حفظ في نفس اللحظة من طلب آخر
+            MediaBlob.objects.filter(name=name).update(refs=F("refs") + 1)
+
+    def delete(self, name):
+        """
+        Drops one reference to a content-addressed file, removing it with the last one.
+        """
+        if not name:
+            raise ValueError("The name must be given to delete().")
+        MediaBlob = apps.get_model("api", "MediaBlob")
+        with transaction.atomic():
+            MediaBlob.objects.filter(name=name, refs__gt=0).update(refs=F("refs") - 1)
+            removed, _ = MediaBlob.objects.filter(name=name, refs=0).delete()
+            if removed:
+                # الملف يحذف بعد تأكيد الحذف، إلا إذا حفظ من جديد في الأثناء
+                transaction.on_commit(lambda: self._remove_unreferenced(name))
+
+    def _remove_unreferenced(self, name):
+        if not apps.get_model("api", "MediaBlob").objects.filter(name=name).exists():
+            super().delete(name)
+
+
+@cache
+def content_storage():
+    """
+    :return: The storage of the uploaded images, shared by the image fields.
+    """
+    return ContentAddressedStorage()
+
+
+def remember_replaced_files(sender, instance, **kwargs):
+    # ملف جديد على سجل موجود: الملف القديم يحرر بعد الحفظ
+    fields = [
+        name
+        for name in FILE_FIELDS[sender._meta.label]
+        if name not in instance.get_deferred_fields()
+        and getattr(instance, name)
+        and not getattr(instance, name)._committed
+    ]
+    if instance.pk is None or not fields:
+        return
+    old = sender.objects.filter(pk=instance.pk).values_list(*fields).first() or ()
+    instance._replaced_files = [name for name in old if name]
+
+
+def release_replaced_files(sender, instance, **kwargs):
+    for name in instance.__dict__.pop("_replaced_files", ()):
+        content_storage().delete(name)
+
+
+def release_deleted_files(sender, instance, **kwargs):
+    for field in FILE_FIELDS[sender._meta.label]:
+        name = getattr(instance, field).name
+        if name:
+            content_storage().delete(name)
+
+
+for _label in FILE_FIELDS:
+    pre_save.connect(remember_replaced_files, sender=_label)
+    post_save.connect(release_replaced_files, sender=_label)
+    post_delete.connect(release_deleted_files, sender=_label)
@@ -1,3 +1,1071 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+from datetime import date, datetime, time, timedelta
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import (
+    AnalysisJob,
+    Child,
+    CustomUser,
+    MediaBlob,
+    MostUseApps,
+    Notification,
+    NotificationCounter,
+    Notifications,
+    UsageApp,
+)
+
+
+@override_settings(ROOT_URLCONF="api.urls")
+class QueryBudgetTests(TestCase):
+    """
+    Listing endpoints must cost a fixed number of queries, however many rows they return.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.father = CustomUser.objects.create(
+            username="father", first_name="اب", last_name="اختبار", userType="0"
+        )
+        children = []
+        for i in range(3):
+            user = CustomUser.objects.create(
+                username=f"child{i}", first_name=f"ابن{i}", last_name="اختبار", userType="1"
+            )
+            children.append(Child.objects.get(ChildUser=user))
+        Child.objects.filter(id__in=[child.id for child in children]).update(
+            FatherUser=cls.father
+        )
+        Notifications.objects.bulk_create(
+            Notifications(ChildUser=children[i % 3], imageOfNotification=f"alerts/{i}.png")
+            for i in range(60)
+        )
+        MostUseApps.objects.bulk_create(
+            MostUseApps(ChildUser=children[i % 3], appName=f"app{i}", hour=time(i % 24, 0))
+            for i in range(12)
+        )
+        Notification.objects.bulk_create(
+            Notification(user=cls.father, message=f"بلاغ {i}") for i in range(20)
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.father)
+
+    def test_notification_feed(self):
+        # mark as read + counter + ETag aggregate + page of notifications with their children
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("notification"), {"limit": 50})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 50)
+        self.assertTrue(all(item["child_first_name"] for item in response.data))
+        self.assertFalse(Notification.objects.filter(is_read=False).exists())
+
+    def test_children_listing(self):
+        # children with their users + most used apps
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("Children"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(sum(len(apps) for _, apps in response.data.values()), 5)
+
+    def test_child_profile(self):
+        cache.clear()
+        child = Child.objects.select_related("ChildUser").first()
+        self.client.force_authenticate(child.ChildUser)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("Children"), {"type": "child"})
+        self.assertEqual(response.data["father_first_name"], "اب")
+        # the child context is cached between requests
+        with self.assertNumQueries(0):
+            self.client.get(reverse("Children"), {"type": "child"})
+
+    def test_child_profile_after_unlink(self):
+        child = Child.objects.select_related("ChildUser").first()
+        self.client.force_authenticate(child.ChildUser)
+        self.client.get(reverse("Children"), {"type": "child"})
+        child.FatherUser = None
+        child.save()
+        response = self.client.get(reverse("Children"), {"type": "child"})
+        self.assertNotIn("father_first_name", response.data)
+
+
+@override_settings(ROOT_URLCONF="api.urls")
+class NotificationFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.father = CustomUser.objects.create(
+            username="father", first_name="اب", last_name="اختبار", userType="0"
+        )
+        user = CustomUser.objects.create(
+            username="child", first_name="ابن", last_name="اختبار", userType="1"
+        )
+        cls.child = Child.objects.get(ChildUser=user)
+        cls.child.FatherUser = cls.father
+        cls.child.save()
+        Notifications.objects.bulk_create(
+            Notifications(
+                ChildUser=cls.child,
+                dateOfNotification=date(2026, 1, 1) + timedelta(days=i // 4),
+                imageOfNotification=f"alerts/{i}.png",
+            )
+            for i in range(25)
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.father)
+
+    def test_cursor_pages_cover_feed_once(self):
+        ids, cursor = [], None
+        while True:
+            params = {"limit": 7, **({"cursor": cursor} if cursor else {})}
+            response = self.client.get(reverse("notification"), params)
+            ids += [item["id"] for item in response.data]
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        expected = Notifications.objects.order_by("-dateOfNotification", "-id")
+        self.assertEqual(ids, list(expected.values_list("id", flat=True)))
+
+    def test_since_returns_only_new_alerts(self):
+        response = self.client.get(reverse("notification"))
+        latest = response.headers["X-Latest-Cursor"]
+        new = Notifications.objects.create(
+            ChildUser=self.child,
+            dateOfNotification=date(2026, 2, 1),
+            imageOfNotification="alerts/new.png",
+        )
+        response = self.client.get(reverse("notification"), {"since": latest})
+        self.assertEqual([item["id"] for item in response.data], [new.id])
+        response = self.client.get(
+            reverse("notification"), {"since": response.headers["X-Latest-Cursor"]}
+        )
+        self.assertEqual(response.data, [])
+
+    def test_unchanged_feed_returns_304(self):
+        response = self.client.get(reverse("notification"))
+        etag = response.headers["ETag"]
+        # mark as read + ETag aggregate, no page query
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("notification"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Notifications.objects.filter(id=Notifications.objects.latest("id").id).delete()
+        response = self.client.get(reverse("notification"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_generated_thumbnail_changes_etag(self):
+        response = self.client.get(reverse("notification"))
+        self.assertIsNone(response.data[0]["thumbnail"])
+        Notifications.objects.filter(id=response.data[0]["id"]).update(
+            thumbnail="thumbnails/0.webp"
+        )
+        response = self.client.get(
+            reverse("notification"), HTTP_IF_NONE_MATCH=response.headers["ETag"]
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data[0]["thumbnail"])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse("notification"), {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(ROOT_URLCONF="api.urls")
+class UnreadCounterTests(TestCase):
+    def setUp(self):
+        self.father = CustomUser.objects.create(
+            username="father", first_name="اب", last_name="اختبار", userType="0"
+        )
+        user = CustomUser.objects.create(
+            username="child", first_name="ابن", last_name="اختبار", userType="1"
+        )
+        self.child = Child.objects.get(ChildUser=user)
+        self.child.FatherUser = self.father
+        self.child.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.father)
+
+    def test_counter_follows_alerts(self):
+        for i in range(3):
+            Notification.objects.create(user=self.father, message=f"بلاغ {i}")
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("notificationsUnread"))
+        self.assertEqual(response.data, {"unread": 3})
+
+        self.client.get(reverse("notification"))
+        self.assertEqual(NotificationCounter.objects.get(user=self.father).unread, 0)
+        self.assertEqual(self.client.get(reverse("notificationsUnread")).data, {"unread": 0})
+
+    def test_no_counter_row(self):
+        response = self.client.get(reverse("notificationsUnread"))
+        self.assertEqual(response.data, {"unread": 0})
+
+
+@override_settings(ROOT_URLCONF="api.urls")
+class StatelessAuthTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.father = CustomUser(username="father", first_name="اب", last_name="اختبار", userType="0")
+        self.father.set_password("secret-pass")
+        self.father.save()
+        user = CustomUser(username="child", first_name="ابن", last_name="اختبار", userType="1")
+        user.set_password("secret-pass")
+        user.save()
+        self.child = Child.objects.get(ChildUser=user)
+        self.client = APIClient()
+
+    def login(self, username, user_type):
+        self.client.credentials()
+        response = self.client.post(
+            reverse("login"),
+            {"username": username, "password": "secret-pass", "userType": user_type},
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        return response.data
+
+    def test_request_without_user_query(self):
+        self.login("father", "0")
+        # the unread counter only, the user comes from the token
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("notificationsUnread"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_link_reaches_issued_tokens(self):
+        self.login("child", "1")
+        self.child.FatherUser = self.father
+        self.child.save()
+        response = self.client.get(reverse("Children"), {"type": "child"})
+        self.assertEqual(response.data["father_first_name"], "اب")
+
+    def test_password_change_revokes_tokens(self):
+        tokens = self.login("father", "0")
+        response = self.client.patch(
+            reverse("updateUser"),
+            {
+                "action": "updatePassword",
+                "currentPassword": "secret-pass",
+                "newPassword": "new-secret-pass",
+                "rePassword": "new-secret-pass",
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(reverse("notificationsUnread")).status_code, 401)
+        response = self.client.post(reverse("token_refresh"), {"refresh": tokens["refresh"]})
+        self.assertEqual(response.status_code, 401)
+
+    def test_deleted_and_inactive_users_without_cached_state(self):
+        self.login("father", "0")
+        CustomUser.objects.filter(id=self.father.id).update(is_active=False)
+        # a restart, another worker or an eviction loses the cached state
+        cache.clear()
+        self.assertEqual(self.client.get(reverse("notificationsUnread")).status_code, 401)
+        self.login("child", "1")
+        self.child.ChildUser.delete()
+        cache.clear()
+        self.assertEqual(self.client.get(reverse("notificationsUnread")).status_code, 401)
+
+    def test_password_change_without_cached_state(self):
+        self.login("father", "0")
+        self.father.set_password("new-secret-pass")
+        CustomUser.objects.filter(id=self.father.id).update(password=self.father.password)
+        cache.clear()
+        self.assertEqual(self.client.get(reverse("notificationsUnread")).status_code, 401)
+
+    def test_saving_does_not_restore_stale_claims(self):
+        self.login("father", "0")
+        response = self.client.patch(
+            reverse("updateUser"),
+            {
+                "action": "updatePersonaInfo",
+                "username": "renamed",
+                "first_name": "اب",
+                "last_name": "اختبار",
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        cache.clear()
+        from io import BytesIO
+
+        from PIL import Image
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        image = BytesIO()
+        Image.new("RGB", (8, 8)).save(image, "PNG")
+        image.name = "me.png"
+        image.seek(0)
+        with self.settings(MEDIA_ROOT=media_root):
+            response = self.client.put(
+                reverse("uploadProfileImage"), {"Image": image}, format="multipart"
+            )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.father.refresh_from_db()
+        self.assertEqual(self.father.username, "renamed")
+        self.assertTrue(self.father.is_active)
+
+    def test_refresh_updates_claims(self):
+        tokens = self.login("child", "1")
+        self.child.FatherUser = self.father
+        self.child.save()
+        cache.clear()  # the published claims expired
+        response = self.client.post(reverse("token_refresh"), {"refresh": tokens["refresh"]})
+        access = AccessToken(response.data["access"])
+        self.assertEqual(access["father_id"], self.father.id)
+        self.assertEqual(access["child_id"], self.child.id)
+
+
+@override_settings(ROOT_URLCONF="api.urls")
+class ChildLinkTests(TestCase):
+    def setUp(self):
+        self.father = CustomUser.objects.create(
+            username="father", first_name="اب", last_name="اختبار", userType="0"
+        )
+        user = CustomUser.objects.create(
+            username="child", first_name="ابن", last_name="اختبار", userType="1"
+        )
+        self.child = Child.objects.get(ChildUser=user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.father)
+
+    def test_link_and_unlink_by_key(self):
+        response = self.client.post(reverse("Children"), {"key": self.child.key})
+        self.assertEqual(response.data, {"key": "تم اضافة الطفل بنجاح"})
+        self.child.refresh_from_db()
+        self.assertEqual(self.child.FatherUser, self.father)
+
+        response = self.client.delete(reverse("Children"), {"key": self.child.key})
+        self.assertEqual(response.status_code, 200)
+        self.child.refresh_from_db()
+        self.assertIsNone(self.child.FatherUser)
+
+    def test_wrong_key(self):
+        response = self.client.post(reverse("Children"), {"key": self.child.key[:-4] + "AAAA"})
+        self.assertIn("key", response.data)
+        self.child.refresh_from_db()
+        self.assertIsNone(self.child.FatherUser)
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = self.settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        user = CustomUser.objects.create(
+            username="child", first_name="ابن", last_name="اختبار", userType="1"
+        )
+        self.child = Child.objects.get(ChildUser=user)
+
+    def alert(self, content, name="screen.PNG"):
+        return Notifications.objects.create(
+            ChildUser=self.child, imageOfNotification=ContentFile(content, name=name)
+        )
+
+    def test_identical_images_share_one_file(self):
+        first, second = self.alert(b"same image"), self.alert(b"same image", "other.png")
+        name = first.imageOfNotification.name
+        self.assertEqual(name, second.imageOfNotification.name)
+        self.assertRegex(name, r"^notifications/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.png$")
+        self.assertEqual(MediaBlob.objects.get(name=name).refs, 2)
+        path = first.imageOfNotification.path
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(os.path.exists(path))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(MediaBlob.objects.exists())
+
+    def test_replaced_profile_image_is_released(self):
+        user = self.child.ChildUser
+        user.profileImage = ContentFile(b"old picture", name="a.jpg")
+        user.save()
+        old = user.profileImage.name
+        user.profileImage = ContentFile(b"new picture", name="b.jpg")
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        self.assertFalse(MediaBlob.objects.filter(name=old).exists())
+        self.assertTrue(os.path.exists(user.profileImage.path))
+
+
+class ThumbnailTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = self.settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        user = CustomUser.objects.create(
+            username="child", first_name="ابن", last_name="اختبار", userType="1"
+        )
+        self.child = Child.objects.get(ChildUser=user)
+
+    def test_thumbnail_of_screenshot(self):
+        from io import BytesIO
+
+        from PIL import Image
+
+        from .serializers import NotificationsSerializer
+        from .thumbnails import generate_thumbnail
+
+        screenshot = BytesIO()
+        Image.effect_noise((1080, 2400), 64).convert("RGB").save(screenshot, "PNG")
+        notification = Notifications.objects.create(
+            ChildUser=self.child,
+            imageOfNotification=ContentFile(screenshot.getvalue(), name="screen.png"),
+        )
+        generate_thumbnail(notification.id)
+        notification.refresh_from_db()
+
+        with notification.thumbnail.open("rb") as thumbnail, Image.open(thumbnail) as img:
+            self.assertEqual(img.format, "WEBP")
+            self.assertEqual(max(img.size), 320)
+        self.assertLess(notification.thumbnail.size * 10, notification.imageOfNotification.size)
+        data = NotificationsSerializer(notification).data
+        self.assertTrue(data["thumbnail"].endswith(".webp"))
+        # a second run keeps the stored thumbnail
+        self.assertIsNone(generate_thumbnail(notification.id))
+
+
+@override_settings(ROOT_URLCONF="api.urls")
+class MediaViewTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = self.settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        user = CustomUser.objects.create(
+            username="child", first_name="ابن", last_name="اختبار", userType="1"
+        )
+        self.content = bytes(range(256)) * 40
+        self.notification = Notifications.objects.create(
+            ChildUser=Child.objects.get(ChildUser=user),
+            imageOfNotification=ContentFile(self.content, name="screen.png"),
+        )
+        self.url = self.notification.imageOfNotification.url
+
+    def test_whole_file(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+        self.assertEqual(response["Content-Type"], "image/png")
+        self.assertIn("immutable", response["Cache-Control"])
+        digest = self.notification.imageOfNotification.name.rsplit("/", 1)[1][:64]
+        self.assertEqual(response["ETag"], f'"{digest}"')
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_range(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=100-199")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], f"bytes 100-199/{len(self.content)}")
+        self.assertEqual(b"".join(response.streaming_content), self.content[100:200])
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=-10")
+        self.assertEqual(b"".join(response.streaming_content), self.content[-10:])
+
+        response = self.client.get(self.url, HTTP_RANGE=f"bytes={len(self.content)}-")
+        self.assertEqual(response.status_code, 416)
+
+        # a changed file ignores the range
+        response = self.client.get(self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"old"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_proxy_modes(self):
+        name = self.notification.imageOfNotification.name
+        with self.settings(MEDIA_SERVING={**settings.MEDIA_SERVING, "MODE": "x-accel"}):
+            response = self.client.get(self.url)
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/{name}")
+        self.assertEqual(response.content, b"")
+        with self.settings(MEDIA_SERVING={**settings.MEDIA_SERVING, "MODE": "x-sendfile"}):
+            response = self.client.get(self.url)
+        self.assertEqual(response["X-Sendfile"], self.notification.imageOfNotification.path)
+
+    def test_outside_media_root(self):
+        self.assertEqual(self.client.get("/media/../settings.py").status_code, 404)
+        self.assertEqual(self.client.get("/media/missing.png").status_code, 404)
+
+
+# thumbnails of the alerts would be generated in background threads on commit
+@override_settings(
+    ROOT_URLCONF="api.urls",
+    NOTIFICATION_THUMBNAILS={**settings.NOTIFICATION_THUMBNAILS, "ENABLED": False},
+)
+class AlertAggregationTests(TestCase):
+    def setUp(self):
+        self.father = CustomUser.objects.create(
+            username="father", first_name="اب", last_name="اختبار", userType="0"
+        )
+        self.children = []
+        for i in range(2):
+            user = CustomUser.objects.create(
+                username=f"child{i}", first_name=f"ابن{i}", last_name="اختبار", userType="1"
+            )
+            child = Child.objects.get(ChildUser=user)
+            child.FatherUser = self.father
+            child.save()
+            self.children.append(child)
+        # flushed by the tests only
+        from . import notifications
+
+        self.aggregator = notifications._aggregator = notifications.AlertAggregator(3600)
+        self.addCleanup(setattr, notifications, "_aggregator", None)
+
+    def alert(self, child):
+        Notifications.objects.create(ChildUser=child, imageOfNotification="alerts/x.png")
+
+    def test_burst_is_coalesced(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(5):
+                self.alert(self.children[0])
+            self.alert(self.children[1])
+        self.assertFalse(Notification.objects.exists())
+        self.aggregator.flush()
+        self.assertEqual(
+            sorted(Notification.objects.values_list("child_id", "count")),
+            [(self.children[0].id, 5), (self.children[1].id, 1)],
+        )
+        self.assertEqual(NotificationCounter.objects.get(user=self.father).unread, 2)
+
+        # later alerts join the unread notification of the child
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(20):
+                self.alert(self.children[0])
+        # savepoint + locked notifications + child names + bulk update + release
+        with self.assertNumQueries(5):
+            self.aggregator.flush()
+        notification = Notification.objects.get(child=self.children[0])
+        self.assertEqual(notification.count, 25)
+        self.assertIn("25", notification.message)
+        self.assertEqual(NotificationCounter.objects.get(user=self.father).unread, 2)
+
+    @override_settings(ALERT_AGGREGATION={**settings.ALERT_AGGREGATION, "ENABLED": False})
+    def test_read_notification_starts_a_new_one(self):
+        self.alert(self.children[0])
+        client = APIClient()
+        client.force_authenticate(self.father)
+        client.get(reverse("notification"))
+        self.alert(self.children[0])
+        self.assertEqual(
+            list(Notification.objects.order_by("id").values_list("is_read", "count")),
+            [(True, 1), (False, 1)],
+        )
+
+
+@override_settings(
+    ROOT_URLCONF="api.urls", PUSH_CHANNEL={**settings.PUSH_CHANNEL, "HEARTBEAT": 0.05}
+)
+class PushChannelTests(TestCase):
+    def setUp(self):
+        self.father = CustomUser.objects.create(
+            username="father", first_name="اب", last_name="اختبار", userType="0"
+        )
+        from .authentication import tokens_for
+
+        self.token = str(tokens_for(self.father).access_token)
+
+    def test_hub_routes_and_drops_slow_clients(self):
+        from .push import PushHub, Subscription
+
+        async def scenario():
+            hub = PushHub()
+            mine, other = Subscription(self.father.id, 2), Subscription(0, 2)
+            hub.subscribers = {self.father.id: {mine}, 0: {other}}
+            event = {"id": 1, "count": 1, "user": self.father.id}
+            hub._deliver([event, event])  # the watcher may see a published notification again
+            self.assertEqual(mine.queue.qsize(), 1)
+            self.assertEqual(other.queue.qsize(), 0)
+            hub._deliver([{**event, "count": 2}, {**event, "id": 2}])
+            self.assertTrue(mine.overflowed)
+            hub.unsubscribe(mine)
+            self.assertEqual(hub.connections, 1)
+
+        asyncio.run(scenario())
+
+    def test_watcher_reads_coalesced_updates(self):
+        from .notifications import write_alerts
+        from .push import _changed_events
+
+        user = CustomUser.objects.create(
+            username="child", first_name="ابن", last_name="اختبار", userType="1"
+        )
+        child = Child.objects.get(ChildUser=user)
+        first = write_alerts({(self.father.id, child.id): 1})[0]
+        since = Notification.objects.get(id=first.id).updated_at
+        # another process adds alerts to the unread notification
+        write_alerts({(self.father.id, child.id): 2})
+        events, newest = _changed_events(since)
+        self.assertEqual([(event["id"], event["count"]) for event in events], [(first.id, 3)])
+        self.assertGreater(newest, since)
+
+        Notification.objects.bulk_create(
+            [Notification(user=self.father, message=str(i)) for i in range(3)]
+        )
+        events, _ = _changed_events(since, page_size=2)
+        self.assertEqual(len(events), 4)
+
+    async def test_stream(self):
+        from .push import hub, serialize
+
+        url = reverse("notificationsStream")
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 401)
+
+        response = await self.async_client.get(url, QUERY_STRING=f"token={self.token}")
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        chunks = asyncio.Queue()
+
+        async def read():
+            async for chunk in response.streaming_content:
+                await chunks.put(chunk)
+
+        reader = asyncio.create_task(read())
+        self.assertTrue((await chunks.get()).startswith(b"retry:"))
+        self.assertEqual(await chunks.get(), b": ping\n\n")
+        self.assertEqual(hub.connections, 1)
+
+        notification = await Notification.objects.acreate(user=self.father, message="تنبيه")
+        hub.publish([notification])
+        chunk = await chunks.get()
+        while chunk == b": ping\n\n":
+            chunk = await chunks.get()
+        event = dict(line.split(": ", 1) for line in chunk.decode().strip().split("\n"))
+        self.assertEqual(event["id"], str(notification.id))
+        self.assertEqual(json.loads(event["data"])["message"], serialize(notification)["message"])
+
+        # a client disconnecting cancels the response task
+        reader.cancel()
+        await asyncio.gather(reader, return_exceptions=True)
+        self.assertEqual(hub.connections, 0)
+
+
+class InferencePoolTests(TestCase):
+    def test_collect_drains_queued_tasks(self):
+        import queue
+
+        from .inference_pool import _collect
+
+        tasks = queue.Queue()
+        for i in range(5):
+            tasks.put((i, i, (3, 64, 64), 0.25))
+        batch, stop = _collect(tasks, 4, 0)
+        self.assertEqual([task[0] for task in batch], [0, 1, 2, 3])
+        self.assertFalse(stop)
+        tasks.put(None)
+        batch, stop = _collect(tasks, 4, 0)
+        self.assertEqual([task[0] for task in batch], [4])
+        self.assertTrue(stop)
+
+    def test_unreachable_server_falls_back_to_local_model(self):
+        from unittest import mock
+
+        import numpy as np
+        from utils.general import LOGGER
+
+        from .detect import detect_verdict
+
+        address = os.path.join(tempfile.mkdtemp(), "missing.sock")
+        pool = {**settings.CONTENT_INFERENCE_POOL, "ENABLED": True, "ADDRESS": address}
+        # stands in for loading the model in this process
+        local = mock.patch("api.detect.get_model", side_effect=LookupError("local model"))
+        with self.settings(CONTENT_INFERENCE_POOL=pool), local as get_model:
+            with self.assertLogs(LOGGER.name, "WARNING") as logs:
+                for _ in range(2):
+                    with self.assertRaisesMessage(LookupError, "local model"):
+                        detect_verdict("best.pt", np.zeros((64, 64, 3), np.uint8), device="cpu")
+        self.assertEqual(get_model.call_count, 2)
+        self.assertEqual(len(logs.records), 1)  # once per outage
+        self.assertIn("manage.py inference_server", logs.output[0])
+
+
+class BatchSchedulerTests(TestCase):
+    def run_concurrently(self, scheduler, images):
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(len(images)) as executor:
+            return list(executor.map(scheduler.submit, images))
+
+    def test_concurrent_requests_share_forward_passes(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        import torch
+
+        from .batching import BatchScheduler
+
+        calls = []
+
+        def model(batch):
+            calls.append(tuple(batch.shape))
+            if (batch < 0).any():
+                raise ValueError("bad image")
+            return (batch[:, :, 0, 0],)  # the first pixel identifies each image
+
+        # the batch waits for company until it is full
+        scheduler = BatchScheduler(model, max_batch_size=4, max_wait_ms=5000)
+        images = [torch.full((3, 32, 32), float(i)) for i in range(4)]
+        for i, pred in enumerate(self.run_concurrently(scheduler, images)):
+            self.assertEqual(pred.tolist(), [[i, i, i]])
+        self.assertEqual(calls, [(4, 3, 32, 32)])
+
+        # images of different shapes are grouped into separate forward passes
+        calls.clear()
+        images = [torch.full((3, 32 * (1 + i % 2), 32), float(i)) for i in range(4)]
+        for i, pred in enumerate(self.run_concurrently(scheduler, images)):
+            self.assertEqual(pred.tolist(), [[i, i, i]])
+        self.assertEqual(sorted(calls), [(2, 3, 32, 32), (2, 3, 64, 32)])
+
+        # a failing forward pass reaches every request of the batch
+        images = [torch.full((3, 32, 32), -1.0 if i == 0 else 1.0) for i in range(4)]
+        with ThreadPoolExecutor(4) as executor:
+            futures = [executor.submit(scheduler.submit, im) for im in images]
+            for future in futures:
+                with self.assertRaisesMessage(ValueError, "bad image"):
+                    future.result()
+
+        self.assertEqual(
+            scheduler.stats(),
+            {
+                "batches": 4,
+                "images": 12,
+                "mean_batch_size": 3.0,
+                "mean_fill": 0.75,
+                "batch_sizes": {2: 2, 4: 2},
+            },
+        )
+
+
+class ContentModelTests(TestCase):
+    names = {0: "first", 1: "second"}
+
+    def prediction(self, objectness, classes):
+        """
+        :return: A (n, 5 + nc) Detect output with valid boxes and the given scores.
+        """
+        import torch
+
+        n = len(objectness)
+        boxes = torch.tensor([[100.0 + 50 * i, 100.0 + 50 * i, 40.0, 40.0] for i in range(n)])
+        return torch.cat(
+            [boxes, torch.tensor(objectness).view(n, 1), torch.tensor(classes)], 1
+        )
+
+    def test_verdict_from_prediction(self):
+        import torch
+        from utils.general import non_max_suppression
+
+        from .detect import SAFE, verdict_from_prediction
+
+        pred = self.prediction([0.1, 0.3], [[0.9, 0.1], [0.2, 0.8]])
+        self.assertEqual(verdict_from_prediction(pred, self.names, 0.35), SAFE)
+        # objectness passes the threshold but objectness * class probability does not
+        pred = self.prediction([0.5, 0.6], [[0.6, 0.4], [0.3, 0.5]])
+        self.assertEqual(verdict_from_prediction(pred, self.names, 0.35), SAFE)
+
+        torch.manual_seed(0)
+        pred = self.prediction(torch.rand(50).tolist(), torch.rand(50, 2).tolist())
+        verdict = verdict_from_prediction(pred, self.names, 0.35)
+        det = non_max_suppression(pred[None], 0.35)[0][0]
+        self.assertTrue(verdict.unsafe)
+        self.assertEqual(verdict.confidence, round(float(det[4]), 2))
+        self.assertEqual(verdict.label, self.names[int(det[5])])
+
+    def test_preprocess_keeps_screenshot_aspect_ratio(self):
+        from types import SimpleNamespace
+
+        import numpy as np
+        import torch
+        from utils.general import scale_boxes
+
+        from .detect import preprocess
+
+        model = SimpleNamespace(stride=32, pt=True, fp16=False, device=torch.device("cpu"))
+        # 1080x2400 fits 288x640 exactly, 1000x2400 is padded to the next stride multiple
+        for width, padded in ((1080, False), (1000, True)):
+            img0 = np.zeros((2400, width, 3), np.uint8)
+            img, ratio, pad = preprocess(img0, model, 640)
+            self.assertEqual(tuple(img.shape), (1, 3, 640, 288))
+            self.assertEqual(img.dtype, torch.float32)
+            self.assertEqual(pad[0] > 0, padded)
+
+            box = torch.tensor([[100.0, 240.0, 540.0, 1200.0]])  # xyxy on the screenshot
+            letterboxed = box * ratio[0] + torch.tensor(pad * 2, dtype=box.dtype)  # dw, dh, dw, dh
+            restored = scale_boxes(img.shape[2:], letterboxed, img0.shape, (ratio, pad))
+            self.assertTrue(torch.allclose(restored, box, atol=0.5))
+
+
+@override_settings(ROOT_URLCONF="api.urls")
+class AnalysisJobTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(
+            username="child", first_name="ابن", last_name="اختبار", userType="1"
+        )
+
+    def test_failing_job_is_retried_then_failed(self):
+        from utils.general import LOGGER
+
+        from .jobs import claim_next_job, enqueue_job, process_job
+
+        job = enqueue_job(self.user, ContentFile(b"not an image", name="screen.png"))
+        for attempt in range(1, settings.CONTENT_ANALYSIS_JOBS["MAX_ATTEMPTS"] + 1):
+            claimed = claim_next_job()
+            self.assertEqual((claimed.id, claimed.attempts), (job.id, attempt))
+            with self.assertLogs(LOGGER.name, "ERROR"):
+                process_job(claimed)
+        job.refresh_from_db()
+        self.assertEqual(job.status, AnalysisJob.FAILED)
+        self.assertEqual(bytes(job.payload), b"")
+        self.assertIsNone(claim_next_job())
+
+    def test_cached_verdict_completes_job(self):
+        from io import BytesIO
+        from unittest import mock
+
+        from PIL import Image
+
+        from .dedup import VerdictCache, dhash
+        from .detect import decode_image
+        from .jobs import claim_next_job, enqueue_job, process_job
+
+        verdict_cache = VerdictCache()
+        patcher = mock.patch("api.analysis.verdict_cache", verdict_cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        screenshot = BytesIO()
+        Image.effect_noise((64, 64), 64).convert("RGB").save(screenshot, "PNG")
+        verdict = {"detected": False, "confidence": 0.0, "label": "", "notification": None}
+        verdict_cache.put(self.user.id, dhash(decode_image(screenshot.getvalue())), verdict)
+        enqueue_job(self.user, ContentFile(screenshot.getvalue(), name="screen.png"))
+        job = process_job(claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, AnalysisJob.DONE)
+        self.assertTrue(job.result["cached"])
+        self.assertEqual(bytes(job.payload), b"")
+
+    def test_unsafe_job_notifies_father_without_views(self):
+        # manage.py analysis_workers never imports api.views, so run the job in a fresh process
+        import subprocess
+        import sys
+        import textwrap
+
+        script = textwrap.dedent(
+            """
+            import json, sys, tempfile
+            from unittest import mock
+            import django
+            django.setup()
+            from django.db import connection
+            from django.test.utils import override_settings, setup_test_environment
+            setup_test_environment()
+            connection.creation.create_test_db(verbosity=0)
+            from api.detect import Verdict
+            from api.jobs import claim_next_job, enqueue_job, process_job
+            from api.models import Child, CustomUser, Notification, NotificationCounter
+            from django.conf import settings
+            from django.core.files.base import ContentFile
+            from PIL import Image
+            from io import BytesIO
+
+            father = CustomUser.objects.create(username="father", userType="0")
+            child = Child.objects.get(ChildUser=CustomUser.objects.create(username="child", userType="1"))
+            child.FatherUser = father
+            child.save()
+            screenshot = BytesIO()
+            Image.new("RGB", (64, 64)).save(screenshot, "PNG")
+            with override_settings(
+                MEDIA_ROOT=tempfile.mkdtemp(),
+                ALERT_AGGREGATION={**settings.ALERT_AGGREGATION, "ENABLED": False},
+                NOTIFICATION_THUMBNAILS={**settings.NOTIFICATION_THUMBNAILS, "ENABLED": False},
+            ), mock.patch("api.analysis.verdict_cache", None), mock.patch(
+                "api.analysis.detect_verdict", return_value=Verdict(True, 0.9, "unsafe")
+            ):
+                enqueue_job(child.ChildUser, ContentFile(screenshot.getvalue(), name="screen.png"))
+                job = process_job(claim_next_job())
+            print(json.dumps({
+                "status": job.status,
+                "views": "api.views" in sys.modules,
+                "notifications": list(Notification.objects.values_list("user_id", "count")),
+                "unread": NotificationCounter.objects.get(user=father).unread,
+                "father": father.id,
+            }))
+            """
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        self.assertFalse(result["views"])
+        self.assertEqual(result["status"], AnalysisJob.DONE)
+        self.assertEqual(result["notifications"], [[result["father"], 1]])
+        self.assertEqual(result["unread"], 1)
+
+    def test_stale_jobs(self):
+        from .jobs import requeue_stale_jobs
+
+        max_attempts = settings.CONTENT_ANALYSIS_JOBS["MAX_ATTEMPTS"]
+        started = timezone.now() - timedelta(hours=1)
+        retried, abandoned, running = (
+            AnalysisJob.objects.create(
+                user=self.user, status=AnalysisJob.RUNNING, started_at=started, attempts=attempts
+            )
+            for attempts in (1, max_attempts, 1)
+        )
+        running.started_at = timezone.now()
+        running.save()
+        self.assertEqual(requeue_stale_jobs(timedelta(minutes=5)), 1)
+        statuses = dict(AnalysisJob.objects.values_list("id", "status"))
+        self.assertEqual(statuses[retried.id], AnalysisJob.PENDING)
+        self.assertEqual(statuses[abandoned.id], AnalysisJob.FAILED)
+        self.assertEqual(statuses[running.id], AnalysisJob.RUNNING)
+
+    def test_poll_is_limited_to_owner(self):
+        job = AnalysisJob.objects.create(user=self.user)
+        other = CustomUser.objects.create(
+            username="other", first_name="اخر", last_name="اختبار", userType="1"
+        )
+        client = APIClient()
+        client.force_authenticate(other)
+        response = client.get(reverse("AnalysisJob", args=[job.id]))
+        self.assertEqual(response.status_code, 404)
+        client.force_authenticate(self.user)
+        response = client.get(reverse("AnalysisJob", args=[job.id]))
+        self.assertEqual(response.data["status"], AnalysisJob.PENDING)
+
+
+@override_settings(ROOT_URLCONF="api.urls")
+class UsageSeriesTests(TestCase):
+    def setUp(self):
+        self.father = CustomUser.objects.create(
+            username="father", first_name="اب", last_name="اختبار", userType="0"
+        )
+        user = CustomUser.objects.create(
+            username="child", first_name="ابن", last_name="اختبار", userType="1"
+        )
+        self.child = Child.objects.get(ChildUser=user)
+        self.child.FatherUser = self.father
+        self.child.save()
+
+    def report(self, day, hour, minute, usage):
+        from .usage import record_usage
+
+        moment = timezone.make_aware(datetime.combine(day, time(hour, minute)))
+        return record_usage(self.child, usage, moment)
+
+    def test_hourly_rollup_from_daily_totals(self):
+        from .usage import usage_series
+
+        day = date(2026, 3, 1)
+        self.report(day, 10, 5, {"maps": 10})
+        self.report(day, 10, 40, {"maps": 25, "chat": 3})
+        self.report(day, 11, 10, {"maps": 30, "chat": 3})
+        self.report(day, 11, 20, {"maps": 20})  # late report with a lower total
+        self.report(day + timedelta(days=1), 0, 10, {"maps": 5})  # the device counter restarts
+
+        hourly = usage_series(self.child, "hour", day, day + timedelta(days=1))
+        self.assertEqual(
+            [(item["time"].hour, item["appName"], item["minutes"]) for item in hourly["series"]],
+            [(10, "maps", 25), (10, "chat", 3), (11, "maps", 5), (0, "maps", 5)],
+        )
+        daily = usage_series(self.child, "day", day, day + timedelta(days=1))
+        self.assertEqual(
+            [(item["time"], item["minutes"]) for item in daily["series"] if item["appName"] == "maps"],
+            [(day, 30), (day + timedelta(days=1), 5)],
+        )
+        self.assertEqual(daily["totals"], {"maps": 35, "chat": 3})
+
+    def test_packed_sample_round_trip(self):
+        from .usage import decode_usage, encode_usage
+
+        usage = {3: 0, 1: 125, 70000: 2**32 - 1}
+        self.assertEqual(decode_usage(encode_usage(usage)), usage)
+        sample = self.report(date(2026, 3, 1), 9, 0, {"maps": 12, "chat": 7})
+        apps = dict(UsageApp.objects.values_list("id", "name"))
+        self.assertEqual(
+            {apps[app]: minutes for app, minutes in decode_usage(sample.data).items()},
+            {"maps": 12, "chat": 7},
+        )
+
+    def test_report_cost_does_not_grow_with_apps(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        client = APIClient()
+        client.force_authenticate(self.child.ChildUser)
+
+        def report(apps):
+            response = client.post(reverse("mostUseApps"), {app: "5" for app in apps})
+            self.assertEqual(response.status_code, 201)
+
+        report(["warmup"])
+        with CaptureQueriesContext(connection) as queries:
+            report([f"small{i}" for i in range(2)])
+        with self.assertNumQueries(len(queries)):
+            report([f"large{i}" for i in range(20)])
+        self.assertEqual(MostUseApps.objects.filter(ChildUser=self.child).count(), 23)
+
+    def test_stats_limited_to_father(self):
+        self.report(timezone.localdate(), 9, 0, {"maps": 12})
+        other = CustomUser.objects.create(
+            username="other", first_name="اخر", last_name="اختبار", userType="0"
+        )
+        client = APIClient()
+        client.force_authenticate(other)
+        response = client.get(reverse("usageStats"), {"ChildUser": self.child.ChildUser_id})
+        self.assertEqual(response.status_code, 404)
+        client.force_authenticate(self.father)
+        response = client.get(reverse("usageStats"), {"ChildUser": self.child.ChildUser_id})
+        self.assertEqual(response.data["totals"], {"maps": 12})
+        response = client.get(
+            reverse("usageStats"), {"ChildUser": self.child.ChildUser_id, "period": "week"}
+        )
+        self.assertEqual(response.status_code, 400)
+        response = client.get(reverse("usageStats"), {"ChildUser": "abc"})
+        self.assertEqual(response.status_code, 400)
+
+
+class VerdictCacheTests(TestCase):
+    def test_near_duplicates_expiry_and_eviction(self):
+        from unittest import mock
+
+        from .dedup import VerdictCache
+
+        verdicts = VerdictCache(max_distance=2, max_entries=2, max_children=2, ttl=60)
+        with mock.patch("api.dedup.time.monotonic", return_value=1000):
+            verdicts.put(1, 0b1111, "first")
+            self.assertEqual(verdicts.get(1, 0b1100), "first")  # 2 bits apart
+            self.assertIsNone(verdicts.get(1, 0b1000))  # 3 bits apart
+            self.assertIsNone(verdicts.get(2, 0b1111))  # another child
+
+            # least recently used hash and child are evicted
+            verdicts.put(1, 0b11110000, "second")
+            verdicts.get(1, 0b1111)
+            verdicts.put(1, 0b111100000000, "third")
+            self.assertIsNone(verdicts.get(1, 0b11110000))
+            self.assertEqual(verdicts.get(1, 0b1111), "first")
+            verdicts.put(2, 0, "child 2")
+            verdicts.get(1, 0b1111)
+            verdicts.put(3, 0, "child 3")
+            self.assertIsNone(verdicts.get(2, 0))
+            self.assertEqual(verdicts.get(1, 0b1111), "first")
+        with mock.patch("api.dedup.time.monotonic", return_value=1061):
+            self.assertIsNone(verdicts.get(1, 0b1111))
+        self.assertEqual(verdicts.stats()["children"], 2)
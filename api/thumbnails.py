@@ -0,0 +1,84 @@
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from PIL import Image, ImageOps, features
+from utils.general import LOGGER
+from .models import Notifications
+from .storage import content_storage
+
+
+def render_thumbnail(file, size, image_format="WEBP", quality=70):
+    """
+    Scales an image down to fit a size x size box.
+    :param file: A readable binary file of the original image.
+    :param image_format: "WEBP" or "JPEG"; JPEG is used when Pillow was built without WebP.
+    :return: (encoded bytes, file extension)
+    """
+    if image_format == "WEBP" and not features.check("webp"):
+        image_format = "JPEG"
+    with Image.open(file) as img:
+        img.draft("RGB", (size, size))  # JPEG يفك بدقة مخفضة مباشرة
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((size, size), Image.Resampling.LANCZOS)
+        if img.mode not in ("RGB", "RGBA") or image_format == "JPEG":
+            img = img.convert("RGB")
+        out = io.BytesIO()
+        img.save(out, image_format, quality=quality, optimize=image_format == "JPEG")
+    return out.getvalue(), ".webp" if image_format == "WEBP" else ".jpg"
+
+
+def generate_thumbnail(notification_id):
+    """
+    Stores the thumbnail of a notification image, unless it already has one.
+    :return: The stored thumbnail name, or None.
+    """
+    config = settings.NOTIFICATION_THUMBNAILS
+    notification = (
+        Notifications.objects.filter(id=notification_id, thumbnail="")
+        .only("id", "imageOfNotification")
+        .first()
+    )
+    if notification is None or not notification.imageOfNotification:
+        return None
+    with notification.imageOfNotification.open("rb") as original:
+        data, ext = render_thumbnail(
+            original, config["SIZE"], config["FORMAT"], config["QUALITY"]
+        )
+    base = os.path.splitext(os.path.basename(notification.imageOfNotification.name))[0]
+    name = content_storage().save(f"thumbnails/{base}{ext}", ContentFile(data))
+    # تحديث مباشر بدون إشارات الحفظ، والبلاغ قد يكون حذف في الأثناء
+    if not Notifications.objects.filter(id=notification_id, thumbnail="").update(thumbnail=name):
+        content_storage().delete(name)
+        return None
+    return name
+
+
+def _run(notification_id):
+    try:
+        generate_thumbnail(notification_id)
+    except Exception:
+        LOGGER.exception(f"Thumbnail of notification {notification_id} failed")
+    finally:
+        close_old_connections()
+
+
+@cache
+def _executor():
+    return ThreadPoolExecutor(
+        max_workers=settings.NOTIFICATION_THUMBNAILS["WORKERS"],
+        thread_name_prefix="thumbnails",
+    )
+
+
+@receiver(post_save, sender=Notifications)
+def schedule_thumbnail(sender, instance, created, **kwargs):
+    # الصورة المصغرة تنشأ خارج الطلب بعد تأكيد حفظ البلاغ
+    if created and settings.NOTIFICATION_THUMBNAILS["ENABLED"]:
+        transaction.on_commit(lambda: _executor().submit(_run, instance.id))
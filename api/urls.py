@@ -1,32 +1,47 @@
-from django.urls import path
+from django.urls import path, re_path
 from .views import (
     Signup,
     LoginView,
     NotificationView,
     UpdateUser,
     MostUseAppsView,
+    UsageStatsView,
     Children,
     UploadProfileImage,
     NotificationAPIView,
+    UnreadCountView,
     ImageContentAnalysis,
+    AnalysisJobView,
 )
+from .media import MediaView
+from .push import notification_stream
 from rest_framework_simplejwt.views import TokenRefreshView
 from django.conf import settings
-from django.conf.urls.static import static
 
 urlpatterns = [
     path("signup/", Signup.as_view(), name="signup"),
     path("login/", LoginView.as_view(), name="login"),
     path("notification/", NotificationView.as_view(), name="notification"),
     path("notifications/", NotificationAPIView.as_view(), name="notifications"),
+    path(
+        "notifications/unread/", UnreadCountView.as_view(), name="notificationsUnread"
+    ),
+    path(
+        "notifications/stream/", notification_stream, name="notificationsStream"
+    ),
     path("mostUseApps/", MostUseAppsView.as_view(), name="mostUseApps"),
+    path("usageStats/", UsageStatsView.as_view(), name="usageStats"),
     path("Children/", Children.as_view(), name="Children"),
     path(
         "uploadProfileImage/", UploadProfileImage.as_view(), name="uploadProfileImage"
     ),
     path("Analysis/", ImageContentAnalysis.as_view(), name="Analysis"),
+    path("Analysis/<uuid:job_id>/", AnalysisJobView.as_view(), name="AnalysisJob"),
     path("updateUser/", UpdateUser.as_view(), name="updateUser"),
     path("refresh/", TokenRefreshView.as_view(), name="token_refresh"),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    re_path(
+        rf"^{settings.MEDIA_URL.strip('/')}/(?P<name>.+)$", MediaView.as_view(), name="media"
+    ),
+]
 
 
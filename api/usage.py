@@ -0,0 +1,137 @@
+import struct
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from .models import UsageApp, UsageDaily, UsageHourly, UsageSample
+
+PERIODS = ("hour", "day")
+
+
+def encode_usage(usage):
+    """
+    Packs {app id: minutes} as little-endian uint32 pairs, 8 bytes per app.
+    """
+    values = [value for pair in sorted(usage.items()) for value in pair]
+    return struct.pack(f"<{len(values)}I", *values)
+
+
+def decode_usage(data):
+    """
+    :return: {app id: minutes} of a UsageSample.data blob.
+    """
+    values = struct.unpack(f"<{len(data) // 4}I", bytes(data))
+    return dict(zip(values[::2], values[1::2]))
+
+
+def intern_apps(names):
+    """
+    Returns the UsageApp id of every app name, creating the missing ones.
+    :return: {name: id}
+    """
+    UsageApp.objects.bulk_create(
+        [UsageApp(name=name) for name in names], ignore_conflicts=True
+    )
+    return dict(UsageApp.objects.filter(name__in=names).values_list("name", "id"))
+
+
+def record_usage(child, usage, recorded_at=None):
+    """
+    Appends a usage report to the time series and updates the rollups incrementally.
+    The device reports the minutes each app was used since the start of the day, so the
+    daily rollup keeps the latest total and the hour of the report gets the growth since
+    the previous report. Costs a constant number of queries per report.
+    :param child: The Child that sent the report.
+    :param usage: {app name: minutes used today}
+    :param recorded_at: Time of the report, now by default.
+    :return: The created UsageSample.
+    """
+    recorded_at = recorded_at or timezone.now()
+    day = timezone.localdate(recorded_at)
+    hour = timezone.localtime(recorded_at).replace(minute=0, second=0, microsecond=0)
+    apps = intern_apps(list(usage))
+    minutes = {apps[name]: max(0, int(value)) for name, value in usage.items()}
+
+    with transaction.atomic():
+        previous = dict(
+            UsageDaily.objects.select_for_update()
+            .filter(ChildUser=child, day=day, app_id__in=minutes)
+            .values_list("app_id", "minutes")
+        )
+        # عداد الجهاز لا ينقص خلال اليوم، القيمة الأقل تعني تقريرا متأخرا
+        growth = {
+            app: total - previous.get(app, 0)
+            for app, total in minutes.items()
+            if total > previous.get(app, 0)
+        }
+        if growth:
+            UsageDaily.objects.bulk_create(
+                [
+                    UsageDaily(ChildUser=child, app_id=app, day=day, minutes=minutes[app])
+                    for app in growth
+                ],
+                update_conflicts=True,
+                unique_fields=["ChildUser", "day", "app"],
+                update_fields=["minutes"],
+            )
+            hourly = dict(
+                UsageHourly.objects.filter(ChildUser=child, hour=hour, app_id__in=growth)
+                .values_list("app_id", "minutes")
+            )
+            UsageHourly.objects.bulk_create(
+                [
+                    UsageHourly(
+                        ChildUser=child,
+                        app_id=app,
+                        hour=hour,
+                        minutes=hourly.get(app, 0) + delta,
+                    )
+                    for app, delta in growth.items()
+                ],
+                update_conflicts=True,
+                unique_fields=["ChildUser", "hour", "app"],
+                update_fields=["minutes"],
+            )
+        return UsageSample.objects.create(
+            ChildUser=child, day=day, recorded_at=recorded_at, data=encode_usage(minutes)
+        )
+
+
+def usage_series(child, period="day", start=None, end=None):
+    """
+    Reads the usage of a child from the rollup tables.
+    :param period: "hour" or "day".
+    :param start: First day (date), 6 days before end by default.
+    :param end: Last day (date), today by default.
+    :return: {"series": [{"time", "appName", "minutes"}, ...], "totals": {app name: minutes}}
+    """
+    if period not in PERIODS:
+        raise ValueError(f"period must be one of {PERIODS}")
+    end = end or timezone.localdate()
+    start = start or end - timedelta(days=6)
+    if period == "day":
+        rows = UsageDaily.objects.filter(ChildUser=child, day__range=(start, end))
+        time_field = "day"
+    else:
+        tz = timezone.get_current_timezone()
+        rows = UsageHourly.objects.filter(
+            ChildUser=child,
+            hour__gte=datetime.combine(start, time.min, tzinfo=tz),
+            hour__lt=datetime.combine(end + timedelta(days=1), time.min, tzinfo=tz),
+        )
+        time_field = "hour"
+
+    series = [
+        {"time": moment, "appName": name, "minutes": minutes}
+        for moment, name, minutes in rows.order_by(time_field, "-minutes").values_list(
+            time_field, "app__name", "minutes"
+        )
+    ]
+    totals = dict(
+        rows.values("app__name")
+        .annotate(total=Sum("minutes"))
+        .order_by("-total")
+        .values_list("app__name", "total")
+    )
+    return {"period": period, "start": start, "end": end, "series": series, "totals": totals}
@@ -2,7 +2,6 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.tokens import RefreshToken
 from .serializers import (
     CustomUserSerializer,
     LoginSerializer,
@@ -13,12 +12,25 @@ from .serializers import (
     ProfileImageSerializer,
     NotificationSerializer,
     ImageContentAnalysisSerializer,
+    AnalysisJobSerializer,
+)
+from .models import (
+    Notifications,
+    MostUseApps,
+    Child,
+    Notification,
+    AnalysisJob,
 )
-from .models import Notifications, CustomUser, MostUseApps, Child, Notification
 from django.http import QueryDict
-from django.db.models.signals import post_save
-from django.dispatch import receiver
-from datetime import timedelta
+from django.db import transaction
+from .usage import record_usage, usage_series
+from .pagination import encode_cursor, feed_etag, keyset_filter
+from .notifications import mark_all_read, unread_count
+from .context import get_principal, principal_for
+from .authentication import load_user, tokens_for
+from django.conf import settings
+from django.utils.http import parse_etags
+from datetime import date, time, timedelta
 import base64
 from django.core.files.base import ContentFile
 
@@ -28,9 +40,9 @@ class LoginView(APIView):
         serializer = LoginSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.validated_data["user"]
-            refresh = RefreshToken.for_user(user)
+            refresh = tokens_for(user)
             if user.userType == "1":
-                child_instance = Child.objects.filter(ChildUser=user.id).first()
+                child_instance = principal_for(user).child
                 if child_instance.FatherUser:
                     return Response(
                         {
@@ -89,9 +101,9 @@ class Signup(APIView):
         serializer = CustomUserSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
-            refresh = RefreshToken.for_user(user)
+            refresh = tokens_for(user)
             if user.userType == "1":
-                child_instance = Child.objects.filter(ChildUser=user.id).first()
+                child_instance = principal_for(user).child
                 return Response(
                     {
                         "refresh": str(refresh),
@@ -150,20 +162,43 @@ class NotificationView(APIView):
 
     def get(self, request, *args, **kwargs):
         user = request.user
-        notifications = Notification.objects.filter(user=user, is_read=False)
-        for noti in notifications:
-            noti.is_read = True
-            noti.save()
-        notifications = Notifications.objects.filter(
-            ChildUser__FatherUser__username=request.user.username
-        )
-        serializer = NotificationsSerializer(notifications, many=True)
-        return Response(serializer.data)
+        mark_all_read(user)
+        config = settings.NOTIFICATION_FEED
+        params = request.query_params
+        try:
+            limit = int(params.get("limit", config["PAGE_SIZE"]))
+            limit = max(1, min(limit, config["MAX_PAGE_SIZE"]))
+            notifications = keyset_filter(
+                Notifications.objects.filter(ChildUser__FatherUser=user),
+                cursor=params.get("cursor"),
+                since=params.get("since"),
+            )
+        except ValueError:
+            return Response(
+                {"error": "قيمة المؤشر أو الحد غير صالحة"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # الصفحة لم تتغير منذ آخر طلب: لا حاجة لجلب البلاغات وتحويلها
+        etag = feed_etag(notifications, user.id, limit, params.get("cursor"), params.get("since"))
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        # بيانات الطفل تجلب في نفس الاستعلام بدلا من استعلامين لكل بلاغ
+        page = list(notifications.select_related("ChildUser__ChildUser")[: limit + 1])
+        headers = {"ETag": etag}
+        if page:
+            headers["X-Latest-Cursor"] = encode_cursor(page[0])
+        if len(page) > limit:
+            page = page[:limit]
+            headers["X-Next-Cursor"] = encode_cursor(page[-1])
+        serializer = NotificationsSerializer(page, many=True)
+        return Response(serializer.data, headers=headers)
 
     def delete(self, request, *args, **kwargs):
         try:
             notification = Notifications.objects.get(
-                ChildUser__FatherUser__username=request.user.username,
+                ChildUser__FatherUser=request.user,
                 id=request.data["NoteId"],
             )
             serializer = NotificationsSerializer()
@@ -201,24 +236,32 @@ class MostUseAppsView(APIView):
             app: (usage / total_usage) * 100 for app, usage in usage_data.items()
         }
 
-        user = CustomUser.objects.get(username=request.user.username)
-        child = Child.objects.get(ChildUser__id=user.id)
+        child = get_principal(request).child
+        if child is None:
+            return Response(
+                {"error": "الطفل غير موجود"}, status=status.HTTP_404_NOT_FOUND
+            )
 
+        rows = []
         for app, usage in usage_data.items():
             usage_time = timedelta(minutes=usage)
             hours, remainder = divmod(usage_time.seconds, 3600)
             minutes, _ = divmod(remainder, 60)
-            most_use_app, created = MostUseApps.objects.get_or_create(
-                ChildUser=child,
-                appName=app,
-                defaults={
-                    "hour": f"{hours:02}:{minutes:02}:00",
-                },
+            rows.append(
+                MostUseApps(
+                    ChildUser=child, appName=app, hour=time(hours, minutes)
+                )
             )
 
-            if not created:
-                most_use_app.hour = f"{hours:02}:{minutes:02}:00"
-                most_use_app.save()
+        # استعلام واحد لكل التطبيقات: إضافة الجديد وتحديث ساعات الموجود
+        with transaction.atomic():
+            MostUseApps.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=["ChildUser", "appName"],
+                update_fields=["hour"],
+            )
+        record_usage(child, usage_data)
 
         return Response(
             {
@@ -243,6 +286,35 @@ class MostUseAppsView(APIView):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+class UsageStatsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            child = Child.objects.filter(
+                FatherUser=request.user, ChildUser=request.query_params.get("ChildUser")
+            ).first()
+            if child is None:
+                return Response(
+                    {"error": "الطفل غير موجود"}, status=status.HTTP_404_NOT_FOUND
+                )
+            start, end = (
+                date.fromisoformat(request.query_params[key])
+                if request.query_params.get(key)
+                else None
+                for key in ("start", "end")
+            )
+            data = usage_series(
+                child, request.query_params.get("period", "day"), start, end
+            )
+        except ValueError:
+            return Response(
+                {"error": "قيم غير صالحة للطفل أو الفترة أو التاريخ"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(data, status=status.HTTP_200_OK)
+
+
 
 class Children(APIView):
     permission_classes = [IsAuthenticated]
@@ -266,29 +338,27 @@ class Children(APIView):
     def get(self, request):
         if "type" not in request.query_params:
             user = request.user
-            children = Child.objects.filter(FatherUser=user.id)
-            childrenIdes = [
-                child.id for child in children
-            ]
+            children = Child.objects.filter(FatherUser=user.id).select_related(
+                "ChildUser", "FatherUser"
+            )
             mostUseApps = MostUseApps.objects.filter(
-                ChildUser__id__in=childrenIdes
+                ChildUser__FatherUser=user.id
             ).order_by("-hour")[:5]
 
             childSerializer = ChildSerializer(children, many=True)
             mostUseAppsSerializer = MostUseAppsSerializer(mostUseApps, many=True)
+            appsByChild = {}
+            for app in mostUseAppsSerializer.data:
+                appsByChild.setdefault(app["ChildUser"], []).append(app)
             data = {}
-            for index, child in enumerate(list(childSerializer.data)):
-                data[index] = [child]
-                apps = [
-                    app
-                    for app in list(mostUseAppsSerializer.data)
-                    if app["ChildUser"] == child["id"]
-                ]
-                data[index].append(apps)
+            for index, child in enumerate(childSerializer.data):
+                data[index] = [child, appsByChild.get(child["id"], [])]
             return Response(data, status=status.HTTP_200_OK)
         else:
-            user = request.user
-            child_instance = Child.objects.filter(ChildUser=user.id).first()
+            # بيانات الملف الشخصي غير مضمنة في التوكن
+            user = load_user(request.user)
+            principal = principal_for(user)
+            child_instance = principal.child
             if child_instance.FatherUser:
                 return Response(
                     {
@@ -341,8 +411,9 @@ class UploadProfileImage(APIView):
     permission_classes = [IsAuthenticated]
 
     def put(self, request):
-        request.data["username"] = request.user.username
-        serializer = ProfileImageSerializer(data=request.data)
+        serializer = ProfileImageSerializer(
+            data=request.data, context={"request": request}
+        )
         if serializer.is_valid():
             user = serializer.validated_data["user"]
             return Response(
@@ -365,10 +436,6 @@ class ImageContentAnalysis(APIView):
     permission_classes = [IsAuthenticated]
 
     def put(self, request):
-        # دمج بيانات المستخدم مع الملف المرسل
-        request_data = request.data.copy()
-        request_data["username"] = request.user.username
-
         # التأكد من وجود ملف مرفق
         if "file" not in request.FILES:
             return Response(
@@ -376,13 +443,27 @@ class ImageContentAnalysis(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        request_data["Image"] = request.FILES["file"]
-
-        serializer = ImageContentAnalysisSerializer(data=request_data)
+        # الملف المرسل يمرر بدون نسخ محتواه
+        serializer = ImageContentAnalysisSerializer(
+            data={"Image": request.FILES["file"]}, context={"request": request}
+        )
 
         if serializer.is_valid():
             user = serializer.validated_data["user"]
-            saved_path = serializer.validated_data["saved_file_path"]
+            job = serializer.validated_data.get("job")
+            if job:
+                return Response(
+                    {
+                        "username": user.username,
+                        "job_id": str(job.id),
+                        "status": job.status,
+                        "message": "✅ تم استلام الصورة وسيتم تحليلها",
+                    },
+                    status=status.HTTP_202_ACCEPTED,
+                )
+
+            result = serializer.validated_data["result"]
+            load_user(user)
 
             return Response(
                 {
@@ -390,7 +471,8 @@ class ImageContentAnalysis(APIView):
                     "gender": user.gender,
                     "first_name": user.first_name,
                     "last_name": user.last_name,
-                    "image_path": saved_path,
+                    "image_path": result["image_path"],
+                    "result": result,
                     "message": "✅ تم تخزين الصورة بنجاح!",
                 },
                 status=status.HTTP_200_OK,
@@ -399,12 +481,25 @@ class ImageContentAnalysis(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class AnalysisJobView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id):
+        job = AnalysisJob.objects.filter(id=job_id, user=request.user).first()
+        if not job:
+            return Response(
+                {"error": "المهمة غير موجودة"}, status=status.HTTP_404_NOT_FOUND
+            )
+        serializer = AnalysisJobSerializer(job)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
 class UpdateUser(APIView):
     permission_classes = [IsAuthenticated]
 
     def patch(self, request):
         serializer = UpdateUserSerializer(
-            instance=request.user, data=request.data, partial=True
+            instance=load_user(request.user), data=request.data, partial=True
         )
         if serializer.is_valid():
             try:
@@ -443,9 +538,8 @@ class NotificationAPIView(APIView):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-@receiver(post_save, sender=Notifications)
-def create_notification(sender, instance, created, **kwargs):
-    if hasattr(instance, "ChildUser") and hasattr(instance.ChildUser, "FatherUser"):
-        Notification.objects.create(
-            user=instance.ChildUser.FatherUser, message=f"تم إنشاء {instance} بنجاح."
-        )
+class UnreadCountView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response({"unread": unread_count(request.user)}, status=status.HTTP_200_OK)
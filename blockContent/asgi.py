@@ -14,3 +14,11 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'blockContent.settings')
 
 application = get_asgi_application()
+
+# تحميل نموذج تحليل الصور عند تشغيل الخادم فقط، لا مع أوامر manage.py
+from django.conf import settings  # noqa: E402
+
+if settings.CONTENT_MODEL_WARMUP:
+    from api.detect import warm_up_models
+
+    warm_up_models()
@@ -65,23 +65,77 @@ SIMPLE_JWT = {
     "ALGORITHM": "HS256",  # الخوارزمية المستخدمة للتوقيع
     "SIGNING_KEY": SECRET_KEY,  # المفتاح السري
     "AUTH_HEADER_TYPES": ("Bearer",),  # نوع التوكين في هيدر الطلب
+    # يعيد قراءة بيانات المستخدم المضمنة في التوكن عند التجديد
+    "TOKEN_REFRESH_SERIALIZER": "api.authentication.ClaimsTokenRefreshSerializer",
+}
+
+# Access tokens carry the user id, userType, child id and father id (api/authentication.py),
+# so authenticated requests build the user without a query. Deleted and deactivated users,
+# password changes and changed claims are checked against the state of the user, cached
+# in the default cache and read from the database on a miss
+JWT_STATELESS_AUTH = {
+    "ENABLED": True,  # False loads the user from the database on every request
+    # seconds a process trusts the cached state of a user (active, password, claims) before
+    # reading it again from the database; with the per-process default cache, a change
+    # made through another worker applies after at most this delay
+    "STATE_TTL": 60,
 }
 
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# DB_ENGINE=postgres for production, sqlite (default) for single-node deployments,
+# which should also set DB_SQLITE_WAL=1
+DB_ENGINE = os.environ.get("DB_ENGINE", "sqlite")
+
+if DB_ENGINE == "postgres":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get("DB_NAME", "blockcontent"),
+            "USER": os.environ.get("DB_USER", "blockcontent"),
+            "PASSWORD": os.environ.get("DB_PASSWORD", ""),
+            "HOST": os.environ.get("DB_HOST", "localhost"),
+            "PORT": os.environ.get("DB_PORT", "5432"),
+            # keep connections open between requests, checked before reuse
+            "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", 60)),
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {},
+        }
     }
-}
+    if int(os.environ.get("DB_POOL_SIZE", 0)):
+        # psycopg 3 connection pool (pip install "psycopg[pool]"), replaces persistent connections
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"]["pool"] = {
+            "min_size": 1,
+            "max_size": int(os.environ["DB_POOL_SIZE"]),
+            "timeout": 10,  # seconds to wait for a free connection
+        }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / "db.sqlite3",
+            "OPTIONS": {
+                "timeout": 20,  # busy_timeout: wait for the write lock instead of failing
+                # take the write lock at BEGIN, so waiting transactions never deadlock
+                "transaction_mode": "IMMEDIATE",
+            },
+        }
+    }
+    if int(os.environ.get("DB_SQLITE_WAL", 0)):
+        # readers no longer block the writer; NORMAL is durable enough with WAL.
+        # Opt-in for deployments: the journal mode is stored in the database file, and
+        # applying it to the db.sqlite3 tracked in git would rewrite it on every checkout
+        DATABASES["default"]["OPTIONS"]["init_command"] = (
+            "PRAGMA journal_mode=WAL;PRAGMA synchronous=NORMAL"
+        )
 
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "api.authentication.ClaimsJWTAuthentication",
     ],
     "DEFAULT_RENDERER_CLASSES": [
         "rest_framework.renderers.JSONRenderer",  # تأكد من أنك تستخدم JSON فقط
@@ -129,6 +183,109 @@ STATIC_URL = "static/"
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "uploads_images")
+# Uploaded images are served by api.media.MediaView: "django" streams them from this
+# process, "x-accel" (nginx) and "x-sendfile" (Apache, lighttpd) hand the copy to the proxy
+MEDIA_SERVING = {
+    "MODE": "django",
+    "X_ACCEL_PREFIX": "/protected-media/",  # nginx internal location aliased to MEDIA_ROOT
+    "IMMUTABLE_MAX_AGE": 365 * 24 * 3600,  # content-addressed files never change
+    "MAX_AGE": 3600,  # files stored before the content-addressed storage
+}
+# Keep uploaded screenshots in memory instead of spooling them to a temp file
+FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024
+
+# Content analysis model (YOLOv5)
+CONTENT_MODEL_WEIGHTS = os.path.join(BASE_DIR, "best.pt")
+CONTENT_MODEL_DEVICE = "cpu"
+# pt | torchscript | onnx | onnx-int8 | openvino, exported next to the weights with
+# export.py (quantize.py for onnx-int8);
+# falls back to pt when the exported artifact is missing
+CONTENT_MODEL_BACKEND = "pt"
+CONTENT_MODEL_THREADS = {
+    "INTRA_OP": 0,  # threads per operator, 0 keeps the runtime default
+    "INTER_OP": 0,  # operators run in parallel, 0 keeps the runtime default
+}
+CONTENT_MODEL_IMGSZ = 640  # long side; screenshots are letterboxed to a stride-multiple rectangle
+# load the model when the ASGI application starts (blockContent/asgi.py) and in
+# analysis_workers, not for other manage.py commands
+CONTENT_MODEL_WARMUP = True
+CONTENT_MODEL_BATCHING = {
+    "ENABLED": True,  # group concurrent screenshots into one forward pass
+    "MAX_BATCH_SIZE": 8,
+    "MAX_WAIT_MS": 10,
+    "LOG_EVERY": 1000,  # log batch-fill statistics every N batches
+}
+# One CPU inference server per node ("manage.py inference_server"): processes pinned to
+# their own cores, running the batches of CONTENT_MODEL_BATCHING. Web and analysis workers
+# hand screenshots to it through shared memory instead of each holding a copy of the model,
+# and load their own copy (with a logged warning) while the server is not reachable
+CONTENT_INFERENCE_POOL = {
+    "ENABLED": True,
+    "ADDRESS": "/tmp/blockcontent-model.sock",  # Unix socket, ("127.0.0.1", port) on Windows
+    "WORKERS": 2,  # processes; the allowed cores are split evenly between them
+    "SLOTS": 16,  # shared-memory image buffers (WORKERS x MAX_BATCH_SIZE), uploads wait when all are in flight
+    "TIMEOUT": 30,  # seconds
+}
+
+# Small images of the notification feed, generated in background threads once a
+# notification is committed; "manage.py generate_thumbnails" fills in missing ones
+NOTIFICATION_THUMBNAILS = {
+    "ENABLED": True,
+    "SIZE": 320,  # pixels, long side
+    "FORMAT": "WEBP",  # WEBP | JPEG
+    "QUALITY": 70,
+    "WORKERS": 2,  # threads per process
+}
+
+# Alerts of a child are coalesced into one parent notification with a count
+# (api/notifications.py), written in bulk from a background thread
+ALERT_AGGREGATION = {
+    "ENABLED": True,  # False writes each alert inside the request that created it
+    "WINDOW": timedelta(minutes=10),  # alerts join the unread notification this recent
+    "FLUSH_INTERVAL": 2,  # seconds between bulk writes
+    "MAX_PENDING": 1000,  # (father, child) pairs that trigger an early write
+}
+
+# Server-Sent Events stream of parent notifications (api/push.py), served by the ASGI
+# application; every worker process keeps its own hub of open streams
+PUSH_CHANNEL = {
+    "HEARTBEAT": 15,  # seconds of silence before a keep-alive comment
+    "QUEUE_SIZE": 100,  # undelivered events per stream before it is told to resync
+    "WATCH_INTERVAL": 1,  # seconds between polls for notifications of other processes
+    "WATCH_OVERLAP": 5,  # seconds each poll reads again (late commits, clock skew)
+    "MAX_CONNECTIONS": 10000,  # open streams per process, more get 503
+    "RETRY_MS": 5000,  # client reconnection delay
+    "REPLAY_LIMIT": 100,  # missed notifications sent after a reconnection
+}
+
+# Cache of the child/father context of authenticated users (api/context.py); with the
+# per-process default cache other workers see a Child change after at most this delay
+PRINCIPAL_CACHE_TTL = 60  # seconds
+
+# Notification feed pages (NotificationView.get)
+NOTIFICATION_FEED = {
+    "PAGE_SIZE": 20,
+    "MAX_PAGE_SIZE": 100,
+}
+
+# Screenshot analysis queue (run workers with: python manage.py analysis_workers)
+CONTENT_ANALYSIS_JOBS = {
+    "ASYNC": True,  # False analyses screenshots inside the request
+    "POLL_INTERVAL": 0.5,  # seconds an idle worker waits before polling again
+    "MAX_ATTEMPTS": 3,
+    "STALE_AFTER": timedelta(minutes=5),  # requeue jobs of workers that died
+    "RETENTION": timedelta(days=1),  # keep finished jobs for polling
+}
+
+# Reuse the verdict of near-identical screenshots from the same child
+CONTENT_ANALYSIS_DEDUP = {
+    "ENABLED": True,
+    "MAX_DISTANCE": 5,  # max differing bits of the 64-bit dHash
+    "MAX_ENTRIES": 64,  # hashes kept per child
+    "MAX_CHILDREN": 1024,
+    "TTL": 60,  # seconds
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
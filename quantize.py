@@ -0,0 +1,214 @@
+"""
+Quantize the content model to INT8 for CPU inference, calibrated on a local folder of screenshots.
+
+The FP32 model is exported to ONNX with export.py (or an existing *.onnx is reused), then statically quantized
+with ONNX Runtime: convolutions get per-channel INT8 weights and activations are calibrated on --source. The
+Detect head decoding (sigmoid, grid and anchor arithmetic) stays in FP32, it is cheap and sensitive to rounding.
+The result is saved as best-int8.onnx next to the weights, with the stride/names metadata DetectMultiBackend needs,
+so it loads like any other ONNX model (CONTENT_MODEL_BACKEND = "onnx-int8" in blockContent/settings.py).
+
+A report comparing the INT8 model with the FP32 model on --val-source (default: --source) is printed and saved as
+best-int8.json: mean latency, verdict agreement at --conf-thres, top-label agreement and top-confidence error.
+
+Requirements:
+    $ pip install onnx onnxruntime
+
+Usage:
+    $ python quantize.py --weights best.pt --source path/to/screenshots
+    $ python quantize.py --weights best.pt --source calib/ --val-source val/ --imgsz 640 --calib-images 300
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import torch
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[0]  # YOLOv5 root directory
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))  # add ROOT to PATH
+if platform.system() != "Windows":
+    ROOT = Path(os.path.relpath(ROOT, Path.cwd()))  # relative
+
+from models.common import DetectMultiBackend
+from utils.augmentations import letterbox
+from utils.dataloaders import IMG_FORMATS
+from utils.general import LOGGER, check_img_size, check_requirements, colorstr, file_size, non_max_suppression, print_args
+from utils.torch_utils import select_device
+
+PREFIX = colorstr("INT8:")
+
+
+def list_images(source, limit=None):
+    """Returns the image files of a folder, sorted, at most `limit` of them."""
+    files = sorted(p for p in Path(source).rglob("*") if p.suffix[1:].lower() in IMG_FORMATS)
+    assert files, f"No images found in {source}"
+    return files[:limit] if limit else files
+
+
+def load_input(file, imgsz, stride):
+    """Reads an image and letterboxes it to the fixed imgsz x imgsz input of the exported model."""
+    im0 = cv2.imread(str(file))
+    im = letterbox(im0, imgsz, stride=stride, auto=False)[0]
+    im = im.transpose((2, 0, 1))[::-1]  # HWC to CHW, BGR to RGB
+    return np.ascontiguousarray(im, dtype=np.float32)[None] / 255.0
+
+
+class CalibrationReader:
+    """Feeds letterboxed screenshots to the ONNX Runtime calibrator."""
+
+    def __init__(self, files, imgsz, stride, input_name="images"):
+        self.paths = list(files)
+        self.files = iter(self.paths)
+        self.imgsz, self.stride, self.input_name = imgsz, stride, input_name
+
+    def get_next(self):
+        file = next(self.files, None)
+        return None if file is None else {self.input_name: load_input(file, self.imgsz, self.stride)}
+
+    def rewind(self):
+        self.files = iter(self.paths)
+
+
+def head_nodes(model_onnx):
+    """
+    Returns the names of the non-Conv nodes of the Detect head, which are kept in FP32.
+
+    Detect() runs last: one Conv per detection layer, each followed by its decoding ops, and a final Concat of the
+    nl decoded outputs. Everything after the first of those nl Convs, except the Convs, is head decoding.
+    """
+    nodes = model_onnx.graph.node
+    nl = len(nodes[-1].input) if nodes[-1].op_type == "Concat" else 3  # number of detection layers
+    start = [i for i, n in enumerate(nodes) if n.op_type == "Conv"][-nl]
+    return [n.name for n in nodes[start:] if n.op_type != "Conv"]
+
+
+def quantize_onnx(f32, f8, calib_files, imgsz, stride, per_channel=True):
+    """Statically quantizes an FP32 ONNX model to INT8 (QDQ format) and copies its metadata."""
+    check_requirements(("onnx", "onnxruntime"))
+    import onnx
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+
+    model_onnx = onnx.load(f32)
+    LOGGER.info(f"{PREFIX} calibrating on {len(calib_files)} images...")
+    quantize_static(
+        f32,
+        f8,
+        CalibrationReader(calib_files, imgsz, stride, model_onnx.graph.input[0].name),
+        quant_format=QuantFormat.QDQ,
+        per_channel=per_channel,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        calibrate_method=CalibrationMethod.MinMax,
+        nodes_to_exclude=head_nodes(model_onnx),
+    )
+
+    # Metadata (stride, names) for DetectMultiBackend
+    model_int8 = onnx.load(f8)
+    del model_int8.metadata_props[:]
+    model_int8.metadata_props.extend(model_onnx.metadata_props)
+    onnx.save(model_int8, f8)
+    return f8
+
+
+def top_detection(model, im, conf_thres, iou_thres):
+    """Runs a model and returns (latency seconds, top confidence, top class) of its best detection."""
+    im = torch.from_numpy(im).to(model.device)
+    t = time.perf_counter()
+    pred = model(im)
+    dt = time.perf_counter() - t
+    det = non_max_suppression(pred, conf_thres, iou_thres, max_det=1)[0]
+    return (dt, float(det[0, 4]), int(det[0, 5])) if len(det) else (dt, 0.0, -1)
+
+
+def compare(f32, f8, files, imgsz, conf_thres, iou_thres, device):
+    """Compares latency and verdicts of the FP32 and INT8 models on the same images."""
+    models = {"fp32": DetectMultiBackend(f32, device=device), "int8": DetectMultiBackend(f8, device=device)}
+    stride = models["fp32"].stride
+    results = {k: [] for k in models}
+    for i, file in enumerate(files):
+        im = load_input(file, imgsz, stride)
+        for k, model in models.items():
+            if i == 0:
+                top_detection(model, im, conf_thres, iou_thres)  # warmup
+            results[k].append(top_detection(model, im, conf_thres, iou_thres))
+
+    a, b = np.array(results["fp32"]), np.array(results["int8"])
+    verdict_a, verdict_b = a[:, 1] > 0, b[:, 1] > 0
+    both = verdict_a & verdict_b
+    report = {
+        "images": len(files),
+        "imgsz": imgsz,
+        "conf_thres": conf_thres,
+        "fp32": {"file": str(f32), "size_mb": round(file_size(f32), 1), "latency_ms": round(a[:, 0].mean() * 1e3, 2)},
+        "int8": {"file": str(f8), "size_mb": round(file_size(f8), 1), "latency_ms": round(b[:, 0].mean() * 1e3, 2)},
+        "speedup": round(a[:, 0].mean() / b[:, 0].mean(), 2),
+        "verdict_agreement": round(float((verdict_a == verdict_b).mean()), 4),
+        "unsafe_fp32": int(verdict_a.sum()),
+        "unsafe_int8": int(verdict_b.sum()),
+        "label_agreement": round(float((a[both, 2] == b[both, 2]).mean()), 4) if both.any() else None,
+        "confidence_mae": round(float(np.abs(a[both, 1] - b[both, 1]).mean()), 4) if both.any() else None,
+    }
+    return report
+
+
+def run(
+    weights=ROOT / "best.pt",  # model.pt path
+    source="",  # folder of calibration screenshots
+    val_source="",  # folder of evaluation screenshots, defaults to source
+    imgsz=640,  # inference size (pixels)
+    calib_images=200,  # maximum number of calibration images
+    conf_thres=0.35,  # verdict confidence threshold
+    iou_thres=0.45,  # NMS IoU threshold
+    per_channel=True,  # per-channel weight quantization
+    device="cpu",  # cuda device, i.e. 0 or 0,1,2,3 or cpu
+):
+    weights = Path(weights)
+    f32 = weights.with_suffix(".onnx")
+    f8 = weights.with_name(f"{weights.stem}-int8.onnx")
+    device = select_device(device)
+    stride = 32
+    imgsz = check_img_size(imgsz, s=stride)
+
+    if not f32.exists():  # FP32 ONNX export with the same input size
+        from export import run as export
+
+        export(weights=weights, imgsz=(imgsz, imgsz), include=("onnx",), device=device.type)
+    assert f32.exists(), f"ONNX export failed, {f32} not found"
+
+    quantize_onnx(str(f32), str(f8), list_images(source, calib_images), imgsz, stride, per_channel)
+    LOGGER.info(f"{PREFIX} saved {f8} ({file_size(f8):.1f} MB)")
+
+    report = compare(f32, f8, list_images(val_source or source), imgsz, conf_thres, iou_thres, device)
+    with open(f8.with_suffix(".json"), "w") as f:
+        json.dump(report, f, indent=2)
+    LOGGER.info(f"{PREFIX} report saved to {f8.with_suffix('.json')}\n{json.dumps(report, indent=2)}")
+    return f8, report
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--weights", type=str, default=ROOT / "best.pt", help="model.pt path")
+    parser.add_argument("--source", type=str, required=True, help="folder of calibration screenshots")
+    parser.add_argument("--val-source", type=str, default="", help="folder of evaluation screenshots")
+    parser.add_argument("--imgsz", "--img", "--img-size", type=int, default=640, help="inference size (pixels)")
+    parser.add_argument("--calib-images", type=int, default=200, help="maximum number of calibration images")
+    parser.add_argument("--conf-thres", type=float, default=0.35, help="verdict confidence threshold")
+    parser.add_argument("--iou-thres", type=float, default=0.45, help="NMS IoU threshold")
+    parser.add_argument("--per-tensor", dest="per_channel", action="store_false", help="per-tensor weight quantization")
+    parser.add_argument("--device", default="cpu", help="cuda device, i.e. 0 or 0,1,2,3 or cpu")
+    opt = parser.parse_args()
+    print_args(vars(opt))
+    return opt
+
+
+if __name__ == "__main__":
+    opt = parse_opt()
+    run(**vars(opt))